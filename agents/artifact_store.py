@@ -0,0 +1,253 @@
+import os
+import tempfile
+import threading
+from collections import deque
+
+
+class ArtifactStore:
+    """
+    Keeps an in-memory snapshot of the artifacts folder and a pre-rendered <ARTIFACTS> block.
+
+    Each file is cached together with its mtime and size, so building a system prompt only
+    re-reads the files that changed since the last call. Writes made through `write` update
+    the snapshot directly and bump `version`.
+
+    Writes go to a temporary file that is renamed over the artifact, so a crash never leaves
+    a truncated file behind. The previous contents of the last `max_history` writes are
+    kept so `rollback` can cheaply restore an earlier version.
+    """
+
+    def __init__(self, directory="artifacts", max_history=100):
+        self.directory = directory
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.render_hits = 0
+        self.render_misses = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._files = {}
+        self._rendered = None
+        self._rendered_key = None
+        # (version, filename, previous contents or None if the file didn't exist)
+        self._history = deque(maxlen=max_history)
+        # Oldest version that can still be rolled back to
+        self._history_floor = 0
+        # Writes may run in a worker thread while the event loop renders prompts
+        self._lock = threading.RLock()
+
+    def _scan(self):
+        """
+        Returns {filename: (mtime_ns, size)} for every regular file in the artifacts folder.
+        Hidden files, such as in-progress temporary files, are skipped.
+        """
+        entries = {}
+        if not os.path.isdir(self.directory):
+            return entries
+
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    entries[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return entries
+
+    def _refresh(self):
+        """
+        Syncs the snapshot with the folder, reading only new or modified files.
+        """
+        entries = self._scan()
+
+        for filename in list(self._files):
+            if filename not in entries:
+                del self._files[filename]
+
+        for filename, key in entries.items():
+            cached = self._files.get(filename)
+            if cached and cached[0] == key:
+                self.hits += 1
+                continue
+
+            self.misses += 1
+            with open(os.path.join(self.directory, filename), "r") as file:
+                self._files[filename] = (key, file.read())
+            self.bytes_read += key[1]
+
+        return entries
+
+    def _store(self, filename, contents):
+        """
+        Atomically writes one file and returns its snapshot key.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{filename}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                file.write(contents)
+            os.replace(tmp_path, os.path.join(self.directory, filename))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        stat = os.stat(os.path.join(self.directory, filename))
+        self.bytes_written += stat.st_size
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _remove(self, filename):
+        try:
+            os.remove(os.path.join(self.directory, filename))
+        except FileNotFoundError:
+            pass
+
+    def _draft_path(self, filename):
+        return os.path.join(self.directory, f".{filename}.draft")
+
+    def write_draft(self, filename, contents):
+        """
+        Saves the partial contents of a file that is still being generated. Drafts are
+        hidden files, so they never show up in the snapshot or the prompt, and they are
+        written in place since they are replaced again a moment later.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._draft_path(filename), "w") as file:
+            file.write(contents)
+
+    def read_draft(self, filename):
+        try:
+            with open(self._draft_path(filename), "r") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def discard_draft(self, filename):
+        try:
+            os.remove(self._draft_path(filename))
+        except FileNotFoundError:
+            pass
+
+    def list_files(self):
+        with self._lock:
+            self._refresh()
+            return sorted(self._files)
+
+    def read(self, filename):
+        """
+        Returns the contents of an artifact, or None if it does not exist.
+        """
+        with self._lock:
+            self._refresh()
+            cached = self._files.get(filename)
+            return cached[1] if cached else None
+
+    def write(self, filename, contents):
+        """
+        Writes an artifact and updates the snapshot without re-reading it.
+        """
+        self.write_many({filename: contents})
+
+    def write_many(self, files):
+        """
+        Writes several artifacts as one batch. This blocks, so async code should call it
+        through asyncio.to_thread.
+        """
+        with self._lock:
+            self._refresh()
+            for filename, contents in files.items():
+                previous = self._files.get(filename)
+                if len(self._history) == self._history.maxlen:
+                    self._history_floor = self._history[0][0]
+                self.version += 1
+                self._history.append((self.version, filename, previous[1] if previous else None))
+                self._files[filename] = (self._store(filename, contents), contents)
+
+    def rollback(self, version):
+        """
+        Restores every artifact to how it was at `version` by undoing the writes made after
+        it. Returns False, changing nothing, if those writes are no longer in the history.
+        """
+        with self._lock:
+            if version < self._history_floor:
+                return False
+
+            undone = False
+            while self._history and self._history[-1][0] > version:
+                _, filename, previous = self._history.pop()
+                if previous is None:
+                    self._remove(filename)
+                    self._files.pop(filename, None)
+                else:
+                    self._files[filename] = (self._store(filename, previous), previous)
+                undone = True
+
+            if undone:
+                # A new version, so prompt blocks rendered from the undone state are rebuilt
+                self.version += 1
+            return True
+
+    def render(self):
+        """
+        Returns the <ARTIFACTS> block for the system prompt, rebuilt only when a file changed.
+        """
+        with self._lock:
+            entries = self._refresh()
+            key = (self.version, tuple(sorted(entries.items())))
+            if self._rendered is not None and key == self._rendered_key:
+                self.render_hits += 1
+                return self._rendered
+
+            self.render_misses += 1
+            parts = ["<ARTIFACTS>\n"]
+            for filename in sorted(self._files):
+                parts.append(f"<FILE name='{filename}'>\n{self._files[filename][1]}\n</FILE>\n")
+            parts.append("</ARTIFACTS>")
+
+            self._rendered = "".join(parts)
+            self._rendered_key = key
+            return self._rendered
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "render_hits": self.render_hits,
+            "render_misses": self.render_misses,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+
+
+class InMemoryArtifactStore(ArtifactStore):
+    """
+    Artifact store that never touches the disk. Each write bumps the file's key so the
+    snapshot and rendered block stay consistent without any stat calls.
+    """
+
+    def __init__(self, files=None, max_history=100):
+        super().__init__(directory=None, max_history=max_history)
+        self.drafts = {}
+        if files:
+            self.write_many(files)
+
+    def _scan(self):
+        return {filename: cached[0] for filename, cached in self._files.items()}
+
+    def _store(self, filename, contents):
+        self.bytes_written += len(contents)
+        return (self.version, len(contents))
+
+    def _remove(self, filename):
+        pass
+
+    def write_draft(self, filename, contents):
+        self.drafts[filename] = contents
+
+    def read_draft(self, filename):
+        return self.drafts.get(filename)
+
+    def discard_draft(self, filename):
+        self.drafts.pop(filename, None)
+
+
+# Shared by all agents so the snapshot is reused across calls
+default_store = ArtifactStore()
@@ -0,0 +1,35 @@
+import asyncio
+
+
+class ArtifactWriter:
+    """
+    Collects the artifact writes of one model turn and flushes them as a single batch.
+
+    Several writes of the same file within the turn are coalesced, so only the last one
+    reaches the store, and patches read the staged contents so they build on earlier
+    writes from the same turn. The flush runs in a worker thread to keep disk I/O off the
+    event loop shared by every session.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._staged = {}
+
+    def stage(self, filename, contents):
+        self._staged[filename] = contents
+
+    def read(self, filename):
+        if filename in self._staged:
+            return self._staged[filename]
+        return self.store.read(filename)
+
+    async def flush(self):
+        """
+        Writes everything staged so far and returns the names of the written files.
+        """
+        if not self._staged:
+            return []
+
+        staged, self._staged = self._staged, {}
+        await asyncio.to_thread(self.store.write_many, staged)
+        return list(staged)
@@ -1,11 +1,65 @@
 import os
-import chainlit as cl
+import logging
+from collections import Counter, defaultdict
+
+from agents.workspace import get_current_store
+from agents.ui import get_ui
+from agents.images import image_cache
+from agents.tool_executor import ToolExecutor
+from agents.patching import PatchConflict, apply_patch
+from agents.budget import get_current_budget
+from agents.context_window import count_text_tokens, count_tokens
+from agents.tracing import tracer
+from agents.artifact_writer import ArtifactWriter
+from agents.clients import get_client, model_router
+from agents.context_builder import OMISSION_MARKER
+from agents.stream_relay import StreamRelay, ToolCallProgress
+from agents.json_stream import parse_arguments
+from agents.scheduler import PRIORITY_DEFAULT, scheduler
+
+logger = logging.getLogger(__name__)
+
+# Tool calls whose streaming progress is shown in the UI
+ARTIFACT_TOOLS = ("updateArtifact", "patchArtifact")
+
+# Completion tokens reserved for a call whose gen_kwargs set no max_tokens
+COMPLETION_ESTIMATE = 1000
+
+# Prompt and provider-cached prompt tokens per agent name, across the process
+prompt_cache_stats = defaultdict(Counter)
+
+
+def cached_prompt_tokens(usage):
+    """
+    Returns the prompt tokens the provider served from its prompt cache.
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", None) or 0
 
 class Agent:
     """
     Base class for all agents.
     """
 
+    # Agents that don't need to see the uploaded screenshot get a text placeholder instead
+    vision = True
+
+    # Key into the model routing config that picks this agent's default gen_kwargs
+    route = "default"
+
+    # Scheduling priority of this agent's LLM calls; lower goes first under load
+    priority = PRIORITY_DEFAULT
+
+    # "prefix" keeps the system prompt static and sends the artifacts after the history, so
+    # the provider can cache the prompt prefix across calls; "classic" embeds the artifacts
+    # in the system prompt
+    prompt_layout = os.getenv("PROMPT_LAYOUT", "prefix")
+
+    # Forces a tool call when set, e.g. {"type": "function", "function": {"name": "submitReview"}}
+    tool_choice = None
+
     tools = [
         {
             "type": "function",
@@ -28,65 +82,285 @@ class Agent:
                     "additionalProperties": False,
                 },
             }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "patchArtifact",
+                "description": "Change part of an existing artifact file. Prefer this over updateArtifact for small changes.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "filename": {
+                            "type": "string",
+                            "description": "The name of the file to patch.",
+                        },
+                        "edits": {
+                            "type": "array",
+                            "description": "Search/replace edits applied in order. Each search text must match exactly once in the file.",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "search": {"type": "string", "description": "The exact text to find, with enough context to be unique."},
+                                    "replace": {"type": "string", "description": "The text to replace it with."},
+                                },
+                                "required": ["search", "replace"],
+                                "additionalProperties": False,
+                            },
+                        },
+                        "diff": {
+                            "type": "string",
+                            "description": "A unified diff of the file, used instead of edits.",
+                        },
+                    },
+                    "required": ["filename"],
+                    "additionalProperties": False,
+                },
+            }
         }
     ]
 
-    def __init__(self, name, client, prompt="", gen_kwargs=None):
+    def __init__(self, name, client=None, prompt="", gen_kwargs=None, artifact_store=None, context_window=None, tool_executor=None, max_iterations=None, context_builder=None):
         self.name = name
-        self.client = client
+        self._client = client
         self.prompt = prompt
-        self.gen_kwargs = gen_kwargs or {
-            "model": "gpt-4o-mini",
-            "temperature": 0.2
-        }
+        self.gen_kwargs = gen_kwargs or model_router.gen_kwargs(self.route)
+        self._artifact_store = artifact_store
+        self.context_window = context_window
+        self.tool_executor = tool_executor or ToolExecutor()
+        # Overrides the run budget's per-agent iteration limit
+        self.max_iterations = max_iterations
+        # Renders a milestone-focused view of the artifacts instead of all of them in full
+        self.context_builder = context_builder
+
+    @property
+    def artifact_store(self):
+        """
+        The store given at construction time, otherwise the workspace of the current session.
+        """
+        return self._artifact_store or get_current_store()
 
-    def _build_system_prompt(self):
+    @property
+    def client(self):
+        """
+        The client given at construction time, otherwise the shared client, built on the
+        first call that needs it.
+        """
+        return self._client or get_client()
+
+    @property
+    def ui(self):
+        """
+        Where streamed output and history updates go: the Chainlit session, or a headless UI.
+        """
+        return get_ui()
+
+    @property
+    def budget(self):
+        """
+        The RunBudget of the build this agent is working on, if one is bound.
+        """
+        return get_current_budget()
+
+    def _check_loop(self, iteration, function_data):
+        """
+        Enforces the run budget once per iteration of an agent's tool-calling loop.
+        """
+        if self.budget:
+            self.budget.check_iteration(self, iteration)
+            self.budget.record_tool_calls(self, function_data, hash(self.artifact_store.render()))
+
+    async def _stop(self, error, message_history):
+        """
+        Ends the agent's loop gracefully after the run budget was exhausted.
+        """
+        note = f"{self.name} stopped early because {error}."
+        logger.warning("%s: %s", self.__class__.__name__, note)
+        message = self.ui.new_message()
+        await message.stream_token(note)
+        await message.update()
+        message_history.append({"role": "system", "content": note})
+        self.ui.save_history(message_history)
+        return note
+
+    def _render_artifacts(self, message_history=None):
+        if self.context_builder:
+            return self.context_builder.render(self.artifact_store, message_history)
+        return self.artifact_store.render()
+
+    def _build_system_prompt(self, message_history=None):
         """
         Builds the system prompt including the agent's prompt and the contents of the artifacts folder.
+
+        With the "prefix" layout the prompt stays static and the artifacts are sent at the
+        end of the messages instead, see `handle_tool_calls`.
         """
-        artifacts_content = "<ARTIFACTS>\n"
-        artifacts_dir = "artifacts"
-
-        if os.path.exists(artifacts_dir) and os.path.isdir(artifacts_dir):
-            for filename in os.listdir(artifacts_dir):
-                file_path = os.path.join(artifacts_dir, filename)
-                if os.path.isfile(file_path):
-                    with open(file_path, "r") as file:
-                        file_content = file.read()
-                        artifacts_content += f"<FILE name='{filename}'>\n{file_content}\n</FILE>\n"
-        
-        artifacts_content += "</ARTIFACTS>"
-        return f"{self.prompt}\n{artifacts_content}"
+        if self.prompt_layout == "prefix":
+            return self.prompt
+        return f"{self.prompt}\n{self._render_artifacts(message_history)}"
     
+    async def _apply_artifact_tool(self, index_data, writer=None):
+        """
+        Applies an updateArtifact or patchArtifact call and returns the system note to add
+        to the history, or None if the call was not an artifact tool.
+
+        With a `writer`, the change is only staged and the caller flushes the whole turn at
+        once; otherwise it is written right away.
+
+        A patch that doesn't apply leaves the file untouched and asks the model to send the
+        complete file with updateArtifact instead. Arguments that were cut off are salvaged:
+        the complete edits of a patch are applied, a file whose contents didn't arrive
+        complete is left unchanged.
+        """
+        if index_data["name"] not in ("updateArtifact", "patchArtifact"):
+            return None
+
+        arguments_dict, truncated = parse_arguments(index_data["arguments"])
+        filename = arguments_dict.get("filename")
+        if not filename:
+            return None
+        if truncated:
+            logger.debug("%s: Salvaged cut-off %s arguments for %s", self.__class__.__name__, index_data["name"], filename)
+
+        flush = writer is None
+        writer = writer or ArtifactWriter(self.artifact_store)
+
+        if index_data["name"] == "updateArtifact":
+            if truncated and "contents" not in arguments_dict:
+                return f"The updateArtifact call for '{filename}' was cut off before its contents were complete, so the file was not changed. The partial contents were kept as a draft. Save the file again, or use patchArtifact to change only part of it."
+            contents = arguments_dict.get("contents")
+            if contents and OMISSION_MARKER in contents:
+                return f"The contents for '{filename}' still contain parts {OMISSION_MARKER}, so saving them would lose those parts. The file was not changed. Use patchArtifact instead."
+        else:
+            current = writer.read(filename)
+            if current is None:
+                return f"The artifact '{filename}' does not exist yet, so it can't be patched. Use updateArtifact to create it."
+            edits = arguments_dict.get("edits")
+            if truncated:
+                # The last edit may have lost its replacement text
+                edits = [edit for edit in edits or [] if isinstance(edit, dict) and "search" in edit and "replace" in edit]
+                if not edits:
+                    return f"The patchArtifact call for '{filename}' was cut off before any edit was complete, so the file was not changed."
+            try:
+                contents = apply_patch(current, edits=edits, diff=None if truncated else arguments_dict.get("diff"))
+            except PatchConflict as e:
+                logger.debug("%s: Patch for %s failed: %s", self.__class__.__name__, filename, e)
+                return f"The patch for '{filename}' could not be applied ({e}). The file was not changed. Use updateArtifact with the complete file contents instead."
+
+        logger.debug("%s: Updating artifacts: %s inside agent", self.__class__.__name__, filename)
+        if not contents:
+            return None
+
+        with tracer.span("tool", agent=self.name, tool=index_data["name"], filename=filename, bytes_written=len(contents)):
+            writer.stage(filename, contents)
+            if flush:
+                await writer.flush()
+        if truncated and index_data["name"] == "updateArtifact":
+            return f"The updateArtifact call for '{filename}' was cut off after its contents arrived, and the artifact '{filename}' was saved from the cut-off arguments. Check that the end of the file is complete."
+        if truncated:
+            return f"The patchArtifact call for '{filename}' was cut off. Its first {len(edits)} complete edits were applied and the artifact '{filename}' was updated; send the remaining edits again."
+        return f"The artifact '{filename}' was updated."
+
+    def _tool_kwargs(self, call_tools):
+        """
+        The tool arguments of a call. With the "prefix" layout the tool schemas are always
+        sent, since they are part of the cached prefix, and tool_choice disables them.
+        """
+        if call_tools:
+            return {"tools": self.tools, **({"tool_choice": self.tool_choice} if self.tool_choice else {})}
+        if self.prompt_layout == "prefix" and self.tools:
+            return {"tools": self.tools, "tool_choice": "none"}
+        return {"tools": None}
+
     async def handle_tool_calls(self, message_history, call_tools=True):
 
-        stream = await self.client.chat.completions.create(messages=message_history, stream=True, tools=self.tools if call_tools else None, **self.gen_kwargs)
-
-        function_data = {}
-        response_message = cl.Message(content="")
-        #await response_message.send()    
-        
-        async for part in stream:
-            if part.choices[0].delta.tool_calls:
-                tool_call = part.choices[0].delta.tool_calls[0]
-                index = tool_call.index
-                function_name_delta = tool_call.function.name or ""
-                arguments_delta = tool_call.function.arguments or ""
-                index_data = function_data.setdefault(index, {})
-                index_data.setdefault("name", []).append(function_name_delta)
-                index_data.setdefault("arguments", []).append(arguments_delta)
-        
-            if token := part.choices[0].delta.content or "":
-                await response_message.stream_token(token)
-
-        await response_message.update()        
-
-        if response_message.content:
-            message_history.append({"role": "assistant", "content": response_message.content})
-            cl.user_session.set("message_history", message_history)        
-
-        for index, index_data in function_data.items():
-            index_data["name"] = ''.join(index_data["name"])
-            index_data["arguments"] = ''.join(index_data["arguments"])
-
-        return response_message, function_data
\ No newline at end of file
+        messages = image_cache.resolve(message_history, vision=self.vision)
+        if self.prompt_layout == "prefix":
+            # The artifacts change between calls, so they go last to keep the prefix cacheable
+            messages.append({"role": "system", "content": self._render_artifacts(message_history)})
+        if self.context_window:
+            messages = self.context_window.fit(messages, prefix_stable=self.prompt_layout == "prefix")
+        if self.budget:
+            self.budget.check()
+
+        with tracer.span("llm_call", agent=self.name, model=self.gen_kwargs.get("model")) as span:
+            # Waits for the process-wide scheduler to admit the call under the rate limits
+            estimate = count_tokens(messages) + self.gen_kwargs.get("max_tokens", COMPLETION_ESTIMATE) if scheduler.tokens else 0
+            async with scheduler.slot(priority=self.priority, tokens=estimate) as slot:
+                stream = await self.client.chat.completions.create(
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **self._tool_kwargs(call_tools),
+                    **self.gen_kwargs,
+                )
+
+                function_data = {}
+                usage = None
+                response_message = self.ui.new_message()
+                relay = StreamRelay(response_message)
+                progress = ToolCallProgress(self.ui, ARTIFACT_TOOLS, store=self.artifact_store)
+
+                async for part in stream:
+                    # The final chunk carries only the token usage
+                    if not part.choices:
+                        usage = part.usage
+                        continue
+
+                    if tracer.enabled and "ttft" not in span.attributes:
+                        span.set(ttft=span.elapsed())
+
+                    # A single chunk can carry deltas for several tool calls
+                    for tool_call in part.choices[0].delta.tool_calls or []:
+                        index = tool_call.index
+                        function_name_delta = tool_call.function.name or ""
+                        arguments_delta = tool_call.function.arguments or ""
+                        index_data = function_data.setdefault(index, {})
+                        index_data.setdefault("name", []).append(function_name_delta)
+                        index_data.setdefault("arguments", []).append(arguments_delta)
+                        await progress.update(index, index_data["name"], index_data["arguments"])
+                        if tracer.enabled and progress.drafts and "first_draft" not in span.attributes:
+                            span.set(first_draft=span.elapsed())
+            
+                    if token := part.choices[0].delta.content or "":
+                        await relay.write(token)
+
+                await relay.close()
+                await progress.close()
+
+            if response_message.content:
+                message_history.append({"role": "assistant", "content": response_message.content})
+                self.ui.save_history(message_history)
+
+            for index, index_data in function_data.items():
+                index_data["name"] = ''.join(index_data["name"])
+                index_data["arguments"] = ''.join(index_data["arguments"])
+
+            cached_tokens = 0
+            if usage is not None:
+                prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+                cached_tokens = cached_prompt_tokens(usage)
+                prompt_cache_stats[self.name]["prompt_tokens"] += prompt_tokens
+                prompt_cache_stats[self.name]["cached_tokens"] += cached_tokens
+                if self.budget:
+                    self.budget.record_prompt_cache(prompt_tokens, cached_tokens)
+                logger.debug("%s: %s of %s prompt tokens were cached", self.__class__.__name__, cached_tokens, prompt_tokens)
+            elif self.budget or tracer.enabled or scheduler.tokens:
+                completion = response_message.content + "".join(index_data["arguments"] for index_data in function_data.values())
+                prompt_tokens, completion_tokens = count_tokens(messages), count_text_tokens(completion)
+
+            if self.budget:
+                self.budget.record_tokens(prompt_tokens + completion_tokens)
+            if scheduler.tokens:
+                slot.settle(prompt_tokens + completion_tokens)
+            if tracer.enabled:
+                span.set(
+                    prompt_tokens=prompt_tokens,
+                    cached_tokens=cached_tokens,
+                    completion_tokens=completion_tokens,
+                    stream_duration=span.elapsed() - span.attributes.get("ttft", 0.0),
+                    queue_wait=slot.waited,
+                    tool_calls=[index_data["name"] for index_data in function_data.values()],
+                )
+
+        return response_message, function_data
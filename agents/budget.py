@@ -0,0 +1,122 @@
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+
+# How often each kind of budget stopped a run, across the process
+budget_trips = Counter()
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised when a run goes over one of its budgets.
+    """
+
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+
+
+class RunBudget:
+    """
+    Limits shared by every agent taking part in one build.
+
+    - max_iterations: tool-calling loop iterations per agent execution (an agent's own
+      `max_iterations` overrides it)
+    - max_tokens: prompt plus completion tokens across all calls of the run
+    - deadline_seconds: wall-clock time since the run started
+    - max_repeated_calls: how often the same agent may make the same tool call against
+      unchanged artifacts before it is considered to be spinning
+    """
+
+    def __init__(self, max_iterations=20, max_tokens=None, deadline_seconds=None, max_repeated_calls=2):
+        self.max_iterations = max_iterations
+        self.max_tokens = max_tokens
+        self.deadline_seconds = deadline_seconds
+        self.max_repeated_calls = max_repeated_calls
+        self.started = time.monotonic()
+        self.tokens = 0
+        # Prompt tokens reported by the API, and how many of them its prompt cache served
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        # Streamed calls answered from and missing the on-disk response cache
+        self.response_cache_hits = 0
+        self.response_cache_misses = 0
+        self.tool_calls = Counter()
+        # How often each kind of budget stopped an agent in this run
+        self.trips = Counter()
+
+    @classmethod
+    def from_env(cls):
+        def number(name, default, cast):
+            value = os.getenv(name)
+            return cast(value) if value else default
+
+        return cls(
+            max_iterations=number("RUN_MAX_ITERATIONS", 20, int),
+            max_tokens=number("RUN_MAX_TOKENS", None, int),
+            deadline_seconds=number("RUN_DEADLINE_SECONDS", None, float),
+            max_repeated_calls=number("RUN_MAX_REPEATED_CALLS", 2, int),
+        )
+
+    def _trip(self, kind, message):
+        self.trips[kind] += 1
+        budget_trips[kind] += 1
+        raise BudgetExceeded(kind, message)
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def check(self):
+        """
+        Raises BudgetExceeded if the run is out of time or tokens.
+        """
+        if self.deadline_seconds is not None and self.elapsed() > self.deadline_seconds:
+            self._trip("deadline", f"the run took longer than {self.deadline_seconds:g} seconds")
+        if self.max_tokens is not None and self.tokens > self.max_tokens:
+            self._trip("tokens", f"the run used more than {self.max_tokens} tokens")
+
+    def record_tokens(self, tokens):
+        self.tokens += tokens
+
+    def record_prompt_cache(self, prompt_tokens, cached_tokens):
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+
+    def record_response_cache(self, hit):
+        if hit:
+            self.response_cache_hits += 1
+        else:
+            self.response_cache_misses += 1
+
+    def check_iteration(self, agent, iteration):
+        limit = getattr(agent, "max_iterations", None) or self.max_iterations
+        if limit is not None and iteration > limit:
+            self._trip("iterations", f"it exceeded {limit} iterations")
+        self.check()
+
+    def record_tool_calls(self, agent, function_data, state):
+        """
+        Counts each tool call against the artifact `state` it was made in, and trips when
+        the same call keeps being repeated without anything changing.
+        """
+        for index_data in function_data.values():
+            key = (agent.name, index_data["name"], index_data["arguments"], state)
+            self.tool_calls[key] += 1
+            if self.tool_calls[key] > self.max_repeated_calls:
+                self._trip("repeated_call", f"it repeated the same {index_data['name']} call {self.tool_calls[key]} times")
+
+    def stats(self):
+        return {"elapsed": self.elapsed(), "tokens": self.tokens, "cached_tokens": self.cached_tokens, "response_cache_hits": self.response_cache_hits, "response_cache_misses": self.response_cache_misses, "tool_calls": sum(self.tool_calls.values()), "trips": dict(self.trips)}
+
+
+current_budget = ContextVar("current_budget", default=None)
+
+
+def get_current_budget():
+    return current_budget.get()
+
+
+def use_budget(budget):
+    return current_budget.set(budget)
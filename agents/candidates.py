@@ -0,0 +1,244 @@
+import os
+import copy
+import json
+import asyncio
+import difflib
+import logging
+
+from agents.base_agent import Agent
+from agents.scheduler import PRIORITY_INTERACTIVE
+from agents.artifact_store import InMemoryArtifactStore
+from agents.plan import parse_milestones
+from agents.review import CHANGES_REQUESTED, latest_review, milestone_in_progress
+from agents.static_checks import ERROR, issue, run_static_checks
+from agents.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class Candidate:
+    """
+    One attempt at a milestone, made on its own branch of the history in a scratch store.
+    """
+
+    def __init__(self, index, store, message_history):
+        self.index = index
+        self.store = store
+        self.message_history = message_history
+        self.response = None
+        self.issues = []
+
+    @property
+    def errors(self):
+        return sum(1 for found in self.issues if found["severity"] == ERROR)
+
+    def score(self):
+        """
+        Lower is better: errors first, then warnings, then the order the candidates were started in.
+        """
+        return (self.errors, len(self.issues) - self.errors, self.index)
+
+    def changes(self, baseline):
+        """
+        The files the candidate wrote that differ from `baseline`.
+        """
+        files = {filename: self.store.read(filename) for filename in self.store.list_files()}
+        return {filename: contents for filename, contents in files.items() if contents != baseline.get(filename)}
+
+    def diff(self, baseline, max_chars=6000):
+        """
+        A unified diff of the candidate's changes, cut off after `max_chars` characters.
+        """
+        parts = []
+        for filename, contents in sorted(self.changes(baseline).items()):
+            before = (baseline.get(filename) or "").splitlines(keepends=True)
+            parts.extend(difflib.unified_diff(before, contents.splitlines(keepends=True), f"a/{filename}", f"b/{filename}"))
+        text = "".join(line if line.endswith("\n") else line + "\n" for line in parts)
+        if len(text) > max_chars:
+            text = text[:max_chars] + f"\n... {len(text) - max_chars} more characters of the diff left out\n"
+        return text or "(no changes)\n"
+
+
+class CandidateSelector(Agent):
+    """
+    Picks the best of several candidate implementations in a single call.
+    """
+
+    route = "reviewer"
+    priority = PRIORITY_INTERACTIVE
+
+    # Judges the diffs against the plan, the screenshot isn't needed
+    vision = False
+
+    tools = [
+        {
+            "type": "function",
+            "function": {
+                "name": "pickCandidate",
+                "description": "Pick the candidate implementation that best implements the current milestone.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "candidate": {
+                            "type": "integer",
+                            "description": "The number of the picked candidate.",
+                        },
+                        "reason": {
+                            "type": "string",
+                            "description": "Why this candidate is better than the others.",
+                        },
+                    },
+                    "required": ["candidate", "reason"],
+                    "additionalProperties": False,
+                },
+            }
+        }
+    ]
+
+    tool_choice = {"type": "function", "function": {"name": "pickCandidate"}}
+
+    def __init__(self, name, client=None, prompt="", gen_kwargs=None, artifact_store=None, context_window=None, tool_executor=None, max_iterations=None, context_builder=None):
+
+        super().__init__(name, client, prompt=prompt, gen_kwargs=gen_kwargs, artifact_store=artifact_store, context_window=context_window, tool_executor=tool_executor, max_iterations=max_iterations, context_builder=context_builder)
+
+    async def select(self, candidates, baseline):
+        """
+        Returns the picked candidate and the reason, or (None, None) if the model didn't
+        pick one of them.
+        """
+        parts = [f"There are {len(candidates)} candidate implementations of the current milestone, shown as diffs against the artifacts.\n"]
+        for number, candidate in enumerate(candidates, 1):
+            parts.append(f"\n## Candidate {number}\n\n```diff\n{candidate.diff(baseline)}```\n")
+            if candidate.issues:
+                parts.append("Automated checks raised these warnings:\n" + "".join(f" - {found['file']}: {found['description']}\n" for found in candidate.issues))
+
+        messages = [
+            {"role": "system", "content": self._build_system_prompt()},
+            {"role": "system", "content": "".join(parts)},
+        ]
+        _, function_data = await self.handle_tool_calls(messages)
+        for index_data in function_data.values():
+            if index_data["name"] != "pickCandidate":
+                continue
+            try:
+                arguments_dict = json.loads(index_data["arguments"])
+            except json.JSONDecodeError:
+                logger.debug("%s: Could not parse pickCandidate arguments", self.__class__.__name__)
+                continue
+            number = arguments_dict.get("candidate")
+            if isinstance(number, int) and 1 <= number <= len(candidates):
+                return candidates[number - 1], arguments_dict.get("reason", "")
+        return None, None
+
+
+class CandidateImplementer:
+    """
+    Implements a milestone several times in parallel and keeps the best attempt.
+
+    Each of the `candidates` copies of `agent` works on its own branch of the history in a
+    scratch in-memory store seeded with the current artifacts; all but the first use
+    `temperature` so the attempts differ. Candidates are ranked by the static checks, one
+    that doesn't mark off the milestone it works on counts as failed, and when more than one passes
+    `selector` picks between them. Only the winner's files reach the real store and only
+    its messages the history. Takes the agent's place in SupervisorAgent.agents.
+    """
+
+    def __init__(self, agent, selector=None, candidates=3, temperature=0.8):
+        self.agent = agent
+        self.name = agent.name
+        self.selector = selector
+        self.candidates = candidates
+        self.temperature = temperature
+
+    @property
+    def artifact_store(self):
+        return self.agent.artifact_store
+
+    @property
+    def ui(self):
+        return self.agent.ui
+
+    def _fork(self, index, store):
+        agent = copy.copy(self.agent)
+        # A name of its own keeps the budget's repeated call check per candidate
+        agent.name = f"{self.agent.name} (candidate {index + 1})"
+        agent._artifact_store = store
+        if index:
+            agent.gen_kwargs = {**self.agent.gen_kwargs, "temperature": self.temperature}
+        return agent
+
+    async def _run(self, index, baseline, message_history):
+        candidate = Candidate(index, InMemoryArtifactStore(files=baseline), message_history.copy())
+        agent = self._fork(index, candidate.store)
+        async with self.ui.new_step(agent.name):
+            with tracer.span("candidate", agent=agent.name):
+                candidate.response = await agent.execute(candidate.message_history)
+        return candidate
+
+    def _check(self, candidate, milestone, milestones_done, rework):
+        """
+        Runs the static checks on a candidate. `milestone` is the number of the milestone the
+        candidate works on, if the history tells; otherwise a new milestone has to be marked
+        off, unless the candidate reworks one that was sent back.
+        """
+        candidate.issues = run_static_checks(candidate.store, milestone=milestone)
+        done = sum(found.done for found in parse_milestones(candidate.store.read("plan.md")))
+        if milestone is None and not rework and done <= milestones_done:
+            candidate.issues.insert(0, issue(ERROR, "plan.md", "No new milestone was marked off."))
+
+    async def execute(self, message_history):
+        """
+        Runs the candidates, commits the winner and returns its response.
+        """
+        store = self.artifact_store
+        baseline = {filename: store.read(filename) for filename in store.list_files()}
+        milestones = parse_milestones(baseline.get("plan.md"))
+        milestones_done = sum(milestone.done for milestone in milestones)
+        # After a review that requested changes, the reworked milestone is already marked off
+        in_progress = milestone_in_progress(message_history, milestones)
+        rework = latest_review(message_history)[0] == CHANGES_REQUESTED
+
+        results = await asyncio.gather(*(self._run(index, baseline, message_history) for index in range(self.candidates)), return_exceptions=True)
+        candidates = [result for result in results if not isinstance(result, BaseException)]
+        if not candidates:
+            raise results[0]
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.warning("%s: A candidate failed: %s", self.__class__.__name__, result)
+
+        for candidate in candidates:
+            self._check(candidate, in_progress.number if in_progress else None, milestones_done, rework)
+        candidates.sort(key=Candidate.score)
+        passing = [candidate for candidate in candidates if not candidate.errors]
+
+        winner, reason = candidates[0], "it has the fewest problems in the automated checks"
+        if len(passing) > 1 and self.selector:
+            with tracer.span("select", agent=self.selector.name, candidates=len(passing)):
+                picked, picked_reason = await self.selector.select(passing, baseline)
+            if picked is not None:
+                winner, reason = picked, picked_reason
+
+        changed = winner.changes(baseline)
+        if changed:
+            await asyncio.to_thread(store.write_many, changed)
+
+        note = f"Kept candidate {winner.index + 1} of {self.candidates}: {reason}"
+        logger.debug("%s: %s", self.__class__.__name__, note)
+        message_history.extend(winner.message_history[len(message_history):])
+        message_history.append({"role": "system", "content": note})
+        message = self.ui.new_message()
+        await message.stream_token(note)
+        await message.update()
+        return winner.response
+
+
+def candidate_implementer_from_env(agent, selector=None):
+    """
+    Wraps `agent` in a CandidateImplementer when IMPLEMENTATION_CANDIDATES is above one,
+    otherwise returns it unchanged.
+    """
+    candidates = int(os.getenv("IMPLEMENTATION_CANDIDATES", "1"))
+    if candidates <= 1:
+        return agent
+    temperature = float(os.getenv("IMPLEMENTATION_CANDIDATE_TEMPERATURE", "0.8"))
+    return CandidateImplementer(agent, selector=selector, candidates=candidates, temperature=temperature)
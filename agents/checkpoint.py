@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+
+from agents.images import IMAGE_REF_PREFIX, image_cache
+from agents.plan import parse_milestones
+
+RUNNING = "running"
+FINISHED = "finished"
+
+
+class CheckpointStore:
+    """
+    SQLite store of build checkpoints, so a build survives a worker restart.
+
+    Each checkpoint holds the message history, the agent calls made so far in the run,
+    the milestone progress and the artifact contents of one session after one agent step.
+    File contents and image payloads are stored once per distinct value in a blob table,
+    so checkpointing after every step costs little more than the files that changed.
+    Only the last `keep` checkpoints of each session are kept, and blobs are deleted
+    once no remaining checkpoint refers to them.
+    """
+
+    def __init__(self, path=".cache/checkpoints.sqlite", keep=5):
+        self.path = path
+        self.keep = keep
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    session_id TEXT NOT NULL,
+                    step INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    PRIMARY KEY (session_id, step)
+                );
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    contents TEXT NOT NULL
+                );
+            """)
+
+    def _put_blob(self, contents):
+        digest = hashlib.sha256(contents.encode("utf-8")).hexdigest()
+        self._connection.execute("INSERT OR IGNORE INTO blobs (hash, contents) VALUES (?, ?)", (digest, contents))
+        return digest
+
+    def _get_blob(self, digest):
+        row = self._connection.execute("SELECT contents FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def _delete_checkpoints(self, where, params):
+        """
+        Deletes the matching checkpoints, then the blobs only they referred to. Blobs are
+        shared across sessions, so a blob is kept while any checkpoint still names its hash.
+        """
+        released = set()
+        for (state,) in self._connection.execute(f"SELECT state FROM checkpoints WHERE {where}", params):
+            state = json.loads(state)
+            released.update(state["artifacts"].values())
+            released.update(state["images"].values())
+        self._connection.execute(f"DELETE FROM checkpoints WHERE {where}", params)
+        stale = [
+            (digest,)
+            for digest in released
+            if self._connection.execute("SELECT 1 FROM checkpoints WHERE instr(state, ?) LIMIT 1", (digest,)).fetchone() is None
+        ]
+        self._connection.executemany("DELETE FROM blobs WHERE hash = ?", stale)
+
+    def save(self, session_id, status, message_history, calls, artifacts, images):
+        """
+        Saves a checkpoint and returns its step number. `artifacts` and `images` map
+        filenames and image digests to their contents.
+        """
+        with self._lock, self._connection:
+            state = {
+                "message_history": message_history,
+                "calls": calls,
+                "milestones": [milestone._asdict() for milestone in parse_milestones(artifacts.get("plan.md"))],
+                "artifacts": {filename: self._put_blob(contents) for filename, contents in artifacts.items()},
+                "images": {digest: self._put_blob(payload) for digest, payload in images.items()},
+            }
+            row = self._connection.execute("SELECT MAX(step) FROM checkpoints WHERE session_id = ?", (session_id,)).fetchone()
+            step = (row[0] or 0) + 1
+            self._connection.execute(
+                "INSERT INTO checkpoints (session_id, step, created, status, state) VALUES (?, ?, ?, ?, ?)",
+                (session_id, step, time.time(), status, json.dumps(state)),
+            )
+            self._delete_checkpoints("session_id = ? AND step <= ?", (session_id, step - self.keep))
+            return step
+
+    def load(self, session_id):
+        """
+        Returns the latest checkpoint of a session, with artifact and image contents filled
+        in, or None if there is none.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT step, status, state FROM checkpoints WHERE session_id = ? ORDER BY step DESC LIMIT 1", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            step, status, state = row
+            state = json.loads(state)
+            state["step"] = step
+            state["status"] = status
+            state["artifacts"] = {filename: self._get_blob(digest) for filename, digest in state["artifacts"].items()}
+            state["images"] = {digest: self._get_blob(blob) for digest, blob in state["images"].items()}
+            return state
+
+    def clear(self, session_id):
+        with self._lock, self._connection:
+            self._delete_checkpoints("session_id = ?", (session_id,))
+
+
+def _image_digests(message_history):
+    for message in message_history:
+        content = message.get("content")
+        if not isinstance(content, list):
+            continue
+        for part in content:
+            url = part.get("image_url", {}).get("url", "") if part.get("type") == "image_url" else ""
+            if url.startswith(IMAGE_REF_PREFIX):
+                yield url[len(IMAGE_REF_PREFIX):]
+
+
+class SessionCheckpoint:
+    """
+    Checkpoints the build of one session. Saving runs in a worker thread so the event
+    loop keeps streaming while SQLite writes.
+    """
+
+    def __init__(self, store, session_id):
+        self.store = store
+        self.session_id = session_id
+
+    async def save(self, message_history, calls, artifact_store, status=RUNNING):
+        artifacts = {filename: artifact_store.read(filename) for filename in artifact_store.list_files()}
+        images = {}
+        for digest in _image_digests(message_history):
+            payload = image_cache.payload(digest)
+            if payload:
+                images[digest] = payload
+        # Snapshot the mutable history before handing it to the thread
+        message_history = list(message_history)
+        calls = [list(call) for call in calls]
+        return await asyncio.to_thread(self.store.save, self.session_id, status, message_history, calls, artifacts, images)
+
+    async def load(self):
+        return await asyncio.to_thread(self.store.load, self.session_id)
+
+    async def restore(self, artifact_store):
+        """
+        Loads the latest checkpoint and puts its artifacts and images back, the images
+        pinned to the session. Returns the checkpoint, or None if the session has none.
+        """
+        state = await self.load()
+        if state is None:
+            return None
+
+        changed = {
+            filename: contents
+            for filename, contents in state["artifacts"].items()
+            if contents is not None and artifact_store.read(filename) != contents
+        }
+        if changed:
+            await asyncio.to_thread(artifact_store.write_many, changed)
+        for digest, payload in state["images"].items():
+            if payload:
+                image_cache.restore(digest, payload, owner=self.session_id)
+        return state
+
+
+def checkpoint_store_from_env():
+    """
+    Returns a CheckpointStore at CHECKPOINT_DB, or None when CHECKPOINT_DB is not set.
+    Checkpoints are only read back when Chainlit resumes a thread, which needs a Chainlit
+    data layer, so they are off unless asked for.
+    """
+    path = os.getenv("CHECKPOINT_DB")
+    if not path:
+        return None
+    return CheckpointStore(path, keep=int(os.getenv("CHECKPOINT_KEEP", "5")))
+
+
+current_checkpoint = ContextVar("current_checkpoint", default=None)
+
+
+def get_current_checkpoint():
+    return current_checkpoint.get()
+
+
+def use_checkpoint(checkpoint):
+    return current_checkpoint.set(checkpoint)
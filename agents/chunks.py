@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+
+def chunk_to_record(part):
+    """
+    Reduces a streamed chat completion chunk to the plain dict the agents care about.
+    """
+    record = {"content": None, "tool_calls": []}
+    if not part.choices:
+        return record
+
+    delta = part.choices[0].delta
+    record["content"] = delta.content
+    for tool_call in delta.tool_calls or []:
+        record["tool_calls"].append({
+            "index": tool_call.index,
+            "id": tool_call.id,
+            "name": tool_call.function.name if tool_call.function else None,
+            "arguments": tool_call.function.arguments if tool_call.function else None,
+        })
+    return record
+
+
+def make_chunk(content=None, tool_calls=None):
+    """
+    Builds an object shaped like an OpenAI streaming chunk from a recorded delta, so
+    replayed streams go through the same code paths as live ones.
+    """
+    delta = SimpleNamespace(
+        content=content,
+        tool_calls=[
+            SimpleNamespace(
+                index=tool_call["index"],
+                id=tool_call.get("id"),
+                function=SimpleNamespace(name=tool_call.get("name"), arguments=tool_call.get("arguments")),
+            )
+            for tool_call in tool_calls or []
+        ] or None,
+    )
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+
+
+async def replay(records):
+    for record in records:
+        yield make_chunk(record.get("content"), record.get("tool_calls"))
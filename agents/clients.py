@@ -0,0 +1,108 @@
+import json
+import os
+
+from agents.response_cache import cached_client_from_env
+from agents.tracing import langfuse_enabled
+
+
+DEFAULT_GEN_KWARGS = {
+    "model": "gpt-4o-mini",
+    "temperature": 0.2
+}
+
+
+def _env_number(name, default, cast):
+    value = os.getenv(name)
+    return cast(value) if value else default
+
+
+def build_client():
+    """
+    Builds the AsyncOpenAI client shared by every agent.
+
+    All calls go through one pooled HTTP client, so connections to the API stay open
+    between agent calls instead of paying a new TLS handshake each time. Rate limit (429)
+    and transient errors are retried by the SDK with exponential backoff, honouring the
+    Retry-After header.
+
+    - OPENAI_MAX_CONNECTIONS: concurrent connections in the pool
+    - OPENAI_MAX_KEEPALIVE: idle connections kept open
+    - OPENAI_KEEPALIVE_SECONDS: how long an idle connection is kept open
+    - OPENAI_CONNECT_TIMEOUT / OPENAI_READ_TIMEOUT: seconds
+    - OPENAI_MAX_RETRIES: retries per request
+
+    The SDKs are imported here rather than at module level, so processes only pay for
+    them once an agent makes its first call. Calls are traced through Langfuse's drop-in
+    client when Langfuse is configured.
+    """
+    import httpx
+    from openai import DefaultAsyncHttpxClient
+
+    if langfuse_enabled():
+        from langfuse.openai import AsyncOpenAI
+    else:
+        from openai import AsyncOpenAI
+
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=_env_number("OPENAI_MAX_CONNECTIONS", 100, int),
+            max_keepalive_connections=_env_number("OPENAI_MAX_KEEPALIVE", 20, int),
+            keepalive_expiry=_env_number("OPENAI_KEEPALIVE_SECONDS", 120.0, float),
+        ),
+        timeout=httpx.Timeout(
+            _env_number("OPENAI_READ_TIMEOUT", 300.0, float),
+            connect=_env_number("OPENAI_CONNECT_TIMEOUT", 10.0, float),
+        ),
+    )
+    client = AsyncOpenAI(http_client=http_client, max_retries=_env_number("OPENAI_MAX_RETRIES", 5, int))
+    return cached_client_from_env(client)
+
+
+_client = None
+
+
+def get_client():
+    """
+    Returns the shared client, building it on first use.
+    """
+    global _client
+    if _client is None:
+        _client = build_client()
+    return _client
+
+
+class ModelRouter:
+    """
+    Chooses the model and generation settings for each kind of agent.
+
+    Routes are keyed by an agent's `route` ("supervisor", "planning", "implementation",
+    "reviewer"); each one overrides keys of the default gen_kwargs. This lets cheap, short
+    calls such as supervisor routing and reviewer verdicts use a smaller model while code
+    generation uses a larger one.
+    """
+
+    def __init__(self, default=None, routes=None):
+        self.default = dict(default or DEFAULT_GEN_KWARGS)
+        self.routes = routes or {}
+
+    @classmethod
+    def from_env(cls):
+        """
+        Reads DEFAULT_MODEL and MODEL_ROUTES, a JSON object (or the path of a JSON file)
+        such as {"implementation": {"model": "gpt-4o"}, "supervisor": {"temperature": 0}}.
+        """
+        default = dict(DEFAULT_GEN_KWARGS)
+        if os.getenv("DEFAULT_MODEL"):
+            default["model"] = os.getenv("DEFAULT_MODEL")
+
+        routes = os.getenv("MODEL_ROUTES", "").strip()
+        if routes and not routes.startswith("{"):
+            with open(routes) as f:
+                routes = f.read()
+        return cls(default, json.loads(routes) if routes else {})
+
+    def gen_kwargs(self, route):
+        return {**self.default, **self.routes.get(route, {})}
+
+
+model_router = ModelRouter.from_env()
@@ -0,0 +1,263 @@
+import re
+import logging
+from html.parser import HTMLParser
+
+from agents.plan import milestone_sections, plan_overview
+from agents.review import CHANGES_REQUESTED, latest_review, milestone_in_progress
+from agents.static_checks import VOID_ELEMENTS
+
+logger = logging.getLogger(__name__)
+
+# Marks the parts of an artifact left out of a prompt. Saving a file that still contains
+# it with updateArtifact would lose those parts, so such writes are refused.
+OMISSION_MARKER = "omitted by the context builder"
+
+# Container tags too generic to tie a section to a milestone that mentions them
+GENERIC_TAGS = {"article", "div", "main", "section", "span"}
+
+_WORD_PATTERN = re.compile(r"[a-z][a-z0-9]+")
+_CSS_NAME_PATTERN = re.compile(r"[.#]?-?[_a-zA-Z][\w-]*")
+
+
+def _words(text):
+    return set(_WORD_PATTERN.findall(text.lower()))
+
+
+class _Element:
+    __slots__ = ("tag", "attrs", "start", "end", "children")
+
+    def __init__(self, tag, attrs, start):
+        self.tag = tag
+        self.attrs = dict(attrs)
+        self.start = start
+        self.end = None
+        self.children = []
+
+    def names(self):
+        """
+        The element's tag, unless it is generic, and the ids and classes of the element
+        and everything inside it.
+        """
+        names = {self.tag} - GENERIC_TAGS
+        stack = [self]
+        while stack:
+            element = stack.pop()
+            if element.attrs.get("id"):
+                names.add(f"#{element.attrs['id']}")
+            names.update(f".{name}" for name in (element.attrs.get("class") or "").split())
+            stack.extend(element.children)
+        return names
+
+
+class _TreeBuilder(HTMLParser):
+    """
+    Builds a tree of elements with their character offsets in the document.
+    """
+
+    def __init__(self, html):
+        super().__init__()
+        self.html = html
+        self.line_offsets = [0]
+        for line in html.splitlines(keepends=True):
+            self.line_offsets.append(self.line_offsets[-1] + len(line))
+        self.root = _Element("#document", [], 0)
+        self.stack = [self.root]
+
+    def position(self):
+        line, column = self.getpos()
+        return self.line_offsets[line - 1] + column
+
+    def handle_starttag(self, tag, attrs):
+        element = _Element(tag, attrs, self.position())
+        self.stack[-1].children.append(element)
+        if tag in VOID_ELEMENTS:
+            element.end = self.position() + len(self.get_starttag_text())
+        else:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        element = _Element(tag, attrs, self.position())
+        element.end = self.position() + len(self.get_starttag_text())
+        self.stack[-1].children.append(element)
+
+    def handle_endtag(self, tag):
+        if tag not in [element.tag for element in self.stack[1:]]:
+            return
+        end = self.html.index(">", self.position()) + 1
+        while self.stack[-1].tag != tag:
+            self.stack.pop().end = end
+        self.stack.pop().end = end
+
+    def build(self):
+        self.feed(self.html)
+        self.close()
+        for element in self.stack[1:]:
+            element.end = len(self.html)
+        return self.root
+
+
+class MilestoneContext:
+    """
+    Builds the artifacts block of an agent's system prompt around one milestone, instead
+    of including every artifact in full.
+
+    - plan.md is reduced to one line per completed milestone, the full text of the current
+      milestone and a count of the remaining ones (plus the overview, if `include_overview`)
+    - index.html keeps the top-level sections that the milestone mentions by tag, id or
+      class, and the last one; the others are collapsed to their opening tag
+    - styles.css keeps the rules whose selectors refer to the kept sections or the
+      milestone, and global rules; the others are listed by selector only
+
+    The current milestone is the one the latest review in the history sent back or comes
+    after, see `milestone_in_progress`. Without such a review it is the first unchecked one
+    for `focus="next"` (implementation) and the last checked one for `focus="latest"`
+    (review); a rework after a review that requested changes also gets the last checked
+    one, since the implementer marked the milestone off before it was reviewed. Files
+    shorter than `full_chars` are always shown in full. With `files`, only those artifacts
+    are shown.
+    """
+
+    def __init__(self, focus="next", include_overview=True, overview_chars=2000, full_chars=4000, files=None):
+        self.focus = focus
+        self.files = files
+        self.include_overview = include_overview
+        self.overview_chars = overview_chars
+        self.full_chars = full_chars
+
+    def _current(self, sections, message_history=None):
+        in_progress = milestone_in_progress(message_history, [milestone for milestone, _ in sections])
+        if in_progress is not None:
+            return next(section for section in sections if section[0] == in_progress)
+        verdict, _ = latest_review(message_history)
+        if self.focus == "latest" or verdict == CHANGES_REQUESTED:
+            done = [section for section in sections if section[0].done]
+            return done[-1] if done else (sections[0] if sections else None)
+        return next((section for section in sections if not section[0].done), None)
+
+    def render_plan(self, plan, current):
+        sections = milestone_sections(plan)
+        if not sections:
+            return plan
+
+        parts = []
+        if self.include_overview:
+            overview = plan_overview(plan)
+            if len(overview) > self.overview_chars:
+                overview = overview[:self.overview_chars].rstrip() + f"\n[... rest of the overview {OMISSION_MARKER} ...]"
+            parts.append(overview)
+
+        completed = [text.splitlines()[0] for milestone, text in sections if milestone.done and (current is None or milestone != current[0])]
+        if completed:
+            parts.append("Completed milestones:\n" + "\n".join(completed))
+        if current:
+            parts.append("Current milestone:\n" + current[1])
+        remaining = [milestone for milestone, _ in sections if not milestone.done and (current is None or milestone != current[0])]
+        if remaining:
+            parts.append(f"{len(remaining)} more milestone(s) after this one, {OMISSION_MARKER}.")
+        return "\n\n".join(parts)
+
+    def render_html(self, html, keywords):
+        """
+        Returns the sliced document and the names used in the sections that were kept.
+        """
+        try:
+            root = _TreeBuilder(html).build()
+        except Exception as e:
+            logger.debug("Could not slice index.html: %s", e)
+            return html, None
+
+        # Descend through wrappers such as <html>, <body> and <main> to the level where
+        # the page splits into sections
+        container = root
+        while True:
+            children = [element for element in container.children if element.tag != "head"]
+            if len(children) != 1 or not children[0].children:
+                break
+            container = children[0]
+        sections = container.children
+        if len(sections) < 2:
+            return html, None
+
+        kept = set()
+        for i, element in enumerate(sections):
+            if i == len(sections) - 1 or {name.lstrip(".#") for name in element.names()} & keywords:
+                kept.add(i)
+
+        parts = [html[:sections[0].start]]
+        names = set()
+        for i, element in enumerate(sections):
+            if i:
+                parts.append(html[sections[i - 1].end:element.start])
+            if i in kept:
+                parts.append(html[element.start:element.end])
+                names |= element.names()
+                continue
+            opening = html[element.start:html.index(">", element.start) + 1]
+            omitted = html.count("\n", element.start, element.end) + 1
+            parts.append(f"{opening}<!-- {omitted} line(s) {OMISSION_MARKER} --></{element.tag}>")
+        parts.append(html[sections[-1].end:])
+        return "".join(parts), names
+
+    def render_css(self, css, names, keywords):
+        rules = []
+        depth = 0
+        start = 0
+        for i, char in enumerate(css):
+            if char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    rules.append((start, i + 1))
+                    start = i + 1
+        if depth or not rules:
+            return css
+
+        wanted = {name.lower() for name in names} | keywords
+        parts = []
+        omitted = []
+        for start, end in rules:
+            selector = re.sub(r"/\*.*?\*/", "", css[start:css.index("{", start)], flags=re.DOTALL).strip()
+            selector_names = {name.lower() for name in _CSS_NAME_PATTERN.findall(selector)}
+            is_global = selector.startswith("@") or not any(name[0] in ".#" for name in selector_names)
+            if is_global or selector_names & wanted or {name.lstrip(".#") for name in selector_names} & keywords:
+                parts.append(css[start:end].strip("\n"))
+            else:
+                omitted.append(selector)
+        if omitted:
+            parts.append(f"/* {len(omitted)} rule(s) {OMISSION_MARKER}: {', '.join(omitted)} */")
+        return "\n".join(parts) + css[rules[-1][1]:].rstrip()
+
+    def render(self, store, message_history=None):
+        """
+        Returns the <ARTIFACTS> block for the system prompt. `message_history` is searched
+        for the latest review to find the current milestone.
+        """
+        files = {filename: store.read(filename) for filename in store.list_files() if self.files is None or filename in self.files}
+        plan = files.get("plan.md")
+        current = self._current(milestone_sections(plan), message_history) if plan else None
+        keywords = _words(current[1]) if current else set()
+
+        views = dict(files)
+        if plan is not None:
+            views["plan.md"] = self.render_plan(plan, current)
+
+        # Names used in the kept parts of index.html, or None if it is shown in full
+        names = None
+        html = files.get("index.html")
+        if html is not None and len(html) > self.full_chars:
+            views["index.html"], names = self.render_html(html, keywords)
+        css = files.get("styles.css")
+        if css is not None and len(css) > self.full_chars and names is not None:
+            views["styles.css"] = self.render_css(css, names, keywords)
+
+        parts = ["<ARTIFACTS>\n"]
+        if any(views[filename] != files[filename] for filename in files):
+            parts.append(
+                "Some artifacts are shown in part, focused on the current milestone. Change them with "
+                "patchArtifact; saving them with updateArtifact would drop the omitted parts.\n"
+            )
+        for filename in sorted(views):
+            parts.append(f"<FILE name='{filename}'>\n{views[filename]}\n</FILE>\n")
+        parts.append("</ARTIFACTS>")
+        return "".join(parts)
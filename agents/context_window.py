@@ -0,0 +1,184 @@
+import re
+import logging
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # optional, falls back to a characters-per-token estimate
+    tiktoken = None
+
+
+# Rough cost of a message's role/formatting and of one image part at the default detail
+MESSAGE_OVERHEAD_TOKENS = 4
+IMAGE_TOKENS = 765
+
+ARTIFACT_NOTE_PATTERN = re.compile(r"^The artifact '(.+)' was updated\.$")
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def count_text_tokens(text):
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(message):
+    """
+    Counts the tokens of a single chat message, including text and image parts.
+    """
+    content = message.get("content") or ""
+    if isinstance(content, str):
+        return MESSAGE_OVERHEAD_TOKENS + count_text_tokens(content)
+
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    for part in content:
+        if part.get("type") == "text":
+            tokens += count_text_tokens(part.get("text", ""))
+        else:
+            tokens += IMAGE_TOKENS
+    return tokens
+
+
+def count_tokens(messages):
+    return sum(count_message_tokens(message) for message in messages)
+
+
+def _message_text(message):
+    content = message.get("content") or ""
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+
+
+class ContextWindow:
+    """
+    Fits a message history into a token budget before it is sent to the model.
+
+    Redundant messages are removed first: repeated "artifact was updated" notes (only the
+    latest per file is kept, since the artifacts themselves are in the system prompt) and
+    back-to-back duplicates. If the history is still over budget, the oldest turns are
+    dropped and replaced by a summary note of at most `summary_lines` lines, so the note
+    doesn't grow with the history. The system prompt and the first user message are always
+    kept, and so are the most recent `keep_recent` messages unless they alone are over
+    budget; the last message is never dropped.
+
+    With `prefix_stable`, earlier "artifact was updated" notes are kept: removing them would
+    change the middle of the history on every call and defeat provider prompt caching.
+    """
+
+    def __init__(self, max_tokens=16000, keep_recent=4, summary_chars=120, summary_lines=20):
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.summary_chars = summary_chars
+        self.summary_lines = summary_lines
+
+    def deduplicate(self, messages, prefix_stable=False):
+        latest_note = {}
+        for i, message in enumerate(messages if not prefix_stable else []):
+            if message.get("role") == "system" and isinstance(message.get("content"), str):
+                match = ARTIFACT_NOTE_PATTERN.match(message["content"])
+                if match:
+                    latest_note[match.group(1)] = i
+
+        deduplicated = []
+        for i, message in enumerate(messages):
+            if message.get("role") == "system" and isinstance(message.get("content"), str):
+                match = ARTIFACT_NOTE_PATTERN.match(message["content"])
+                if match and latest_note.get(match.group(1), i) != i:
+                    continue
+            if deduplicated and deduplicated[-1] == message:
+                continue
+            deduplicated.append(message)
+        return deduplicated
+
+    def _summary_line(self, message):
+        text = " ".join(_message_text(message).split())
+        if len(text) > self.summary_chars:
+            text = text[:self.summary_chars] + "..."
+        return f"- {message.get('role')}: {text}\n" if text else ""
+
+    def summarize(self, messages, max_lines=None):
+        """
+        Builds a compact note standing in for dropped messages: one line for each of the
+        last `max_lines` (default `summary_lines`) of them, and a count of the older ones.
+        """
+        max_lines = self.summary_lines if max_lines is None else max_lines
+        shown = messages[len(messages) - max_lines:] if max_lines else []
+        lines = "".join(self._summary_line(message) for message in shown)
+        if len(messages) > len(shown):
+            lines = f"- {len(messages) - len(shown)} older messages left out\n" + lines
+        return {"role": "system", "content": f"Summary of {len(messages)} earlier messages:\n{lines}"}
+
+    def fit(self, messages, prefix_stable=False):
+        """
+        Returns a new list of messages within the budget. The input list is not modified.
+        """
+        messages = self.deduplicate(messages, prefix_stable=prefix_stable)
+        if count_tokens(messages) <= self.max_tokens:
+            return messages
+
+        pinned_head = []
+        start = 0
+        if messages and messages[0].get("role") == "system":
+            pinned_head.append(messages[0])
+            start = 1
+        for i in range(start, len(messages)):
+            if messages[i].get("role") == "user":
+                pinned_head.extend(messages[start:i + 1])
+                start = i + 1
+                break
+
+        rest = messages[start:]
+
+        # Drop the oldest messages until everything, summary included, fits. The last
+        # `keep_recent` messages only go when they alone are over budget, and the last one
+        # never does. The summary stops growing at `summary_lines` lines; it is estimated
+        # here from its lines and measured once the loop is done.
+        budget = self.max_tokens - count_tokens(pinned_head)
+        kept_tokens = count_tokens(rest)
+        line_tokens = []
+        dropped = 0
+
+        def summary_tokens():
+            if not dropped:
+                return 0
+            shown = line_tokens[max(0, dropped - self.summary_lines):] if self.summary_lines else []
+            return MESSAGE_OVERHEAD_TOKENS + 16 + sum(shown)
+
+        def drop_until(limit):
+            nonlocal kept_tokens, dropped
+            while dropped < limit and kept_tokens + summary_tokens() > budget:
+                kept_tokens -= count_message_tokens(rest[dropped])
+                line_tokens.append(count_text_tokens(self._summary_line(rest[dropped])))
+                dropped += 1
+
+        drop_until(len(rest) - self.keep_recent)
+        if kept_tokens > budget:
+            drop_until(len(rest) - 1)
+
+        fitted = list(pinned_head)
+        if dropped:
+            summary = self.summarize(rest[:dropped])
+            if kept_tokens + count_message_tokens(summary) > budget:
+                # Estimated too low; a bare count of the dropped messages is the smallest note
+                summary = self.summarize(rest[:dropped], max_lines=0)
+            fitted.append(summary)
+        fitted.extend(rest[dropped:])
+
+        tokens = count_tokens(fitted)
+        if tokens > self.max_tokens:
+            logger.warning("Context is %s tokens over the %s token budget even after dropping %s messages", tokens - self.max_tokens, self.max_tokens, dropped)
+        return fitted
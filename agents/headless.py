@@ -0,0 +1,59 @@
+import time
+import logging
+
+from agents.budget import RunBudget, current_budget, use_budget
+from agents.plan import parse_milestones
+from agents.scheduler import current_session_id, use_session_id
+from agents.ui import HeadlessUI, current_ui, use_ui
+from agents.workspace import current_store, use_workspace
+
+logger = logging.getLogger(__name__)
+
+
+async def run_headless(supervisor, message_history, store, session_id, budget=None):
+    """
+    Runs one build outside Chainlit and returns a report of how it went.
+
+    The build gets its own workspace, a HeadlessUI, its own run budget and `session_id`
+    for the LLM scheduler; the bindings are undone afterwards, so several builds can run
+    concurrently in one event loop. A build succeeds when it ends with a plan whose
+    milestones are all marked off.
+    """
+    ui = HeadlessUI()
+    budget = budget or RunBudget.from_env()
+    tokens = [
+        (current_store, use_workspace(store)),
+        (current_ui, use_ui(ui)),
+        (current_session_id, use_session_id(session_id)),
+        (current_budget, use_budget(budget)),
+    ]
+    started = time.monotonic()
+    error = None
+    try:
+        await supervisor.execute(message_history)
+    except Exception as e:
+        logger.exception("Build %s failed", session_id)
+        error = f"{e.__class__.__name__}: {e}"
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+    milestones = parse_milestones(store.read("plan.md"))
+    done = sum(milestone.done for milestone in milestones)
+    return {
+        "session_id": session_id,
+        "success": error is None and bool(milestones) and done == len(milestones),
+        "error": error,
+        "latency": time.monotonic() - started,
+        "tokens": budget.tokens,
+        "cached_tokens": budget.cached_tokens,
+        "response_cache_hits": budget.response_cache_hits,
+        "response_cache_misses": budget.response_cache_misses,
+        "tool_calls": sum(budget.tool_calls.values()),
+        "budget_trips": dict(budget.trips),
+        "milestones": len(milestones),
+        "milestones_done": done,
+        "files": store.list_files(),
+        "message_history": message_history,
+        "messages": [message.content for message in ui.messages],
+    }
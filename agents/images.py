@@ -0,0 +1,180 @@
+import base64
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+
+try:
+    from PIL import Image
+except ImportError:  # optional, images are sent as uploaded without it
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_REF_PREFIX = "image-ref://"
+
+MAGIC_NUMBERS = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def detect_mime(data, default="image/jpeg"):
+    """
+    Detects the image type from its leading bytes instead of trusting the upload label.
+    """
+    for magic, mime in MAGIC_NUMBERS:
+        if data.startswith(magic):
+            return mime
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return default
+
+
+class ImageCache:
+    """
+    Encodes uploaded images once and lets the message history reference them by hash.
+
+    `add` downsizes the image to `max_side` pixels (when Pillow is installed), keeps the
+    smaller of the original and recompressed bytes, and caches the data URL under the
+    sha256 of the upload. The history only stores an `image-ref://<hash>` URL, which
+    `resolve` swaps for the cached payload right before an API call, or for a short text
+    placeholder when the calling agent does not need vision.
+
+    At most `max_entries` images are kept, least recently used first out, but an image
+    added with an `owner` (a chat session or a batch build) is pinned until `release(owner)`,
+    so a long-running session can't lose its screenshot to newer uploads. `add` is safe to
+    call from a worker thread.
+    """
+
+    def __init__(self, max_side=1024, jpeg_quality=85, max_entries=64):
+        self.max_side = max_side
+        self.jpeg_quality = jpeg_quality
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._payloads = OrderedDict()
+        # Digests pinned by each owner
+        self._pins = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def _recompress(self, data, mime):
+        if Image is None:
+            return data, mime
+
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.load()
+                if max(image.size) > self.max_side:
+                    image.thumbnail((self.max_side, self.max_side))
+
+                output = io.BytesIO()
+                if image.mode in ("RGBA", "LA", "P"):
+                    image.save(output, format="PNG", optimize=True)
+                    new_mime = "image/png"
+                else:
+                    image.convert("RGB").save(output, format="JPEG", quality=self.jpeg_quality, optimize=True)
+                    new_mime = "image/jpeg"
+        except Exception as e:
+            logger.warning("ImageCache: could not recompress image, sending it as uploaded: %s", e)
+            return data, mime
+
+        if output.tell() < len(data):
+            return output.getvalue(), new_mime
+        return data, mime
+
+    def _evict(self):
+        pinned = set().union(*self._pins.values())
+        for digest in [digest for digest in self._payloads if digest not in pinned]:
+            if len(self._payloads) <= self.max_entries:
+                break
+            del self._payloads[digest]
+
+    def _pin(self, digest, owner):
+        if owner is not None:
+            self._pins[owner].add(digest)
+
+    def add(self, data, mime=None, owner=None):
+        """
+        Caches an image and returns the message content part that references it. With an
+        `owner`, the image stays cached until the owner is released.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            cached = digest in self._payloads
+            if cached:
+                self.hits += 1
+                self._payloads.move_to_end(digest)
+                self._pin(digest, owner)
+        if not cached:
+            # Recompressing is the slow part, so it runs outside the lock
+            encoded, encoded_mime = self._recompress(data, detect_mime(data, default=mime or "image/jpeg"))
+            with self._lock:
+                self.misses += 1
+                self._payloads[digest] = f"data:{encoded_mime};base64,{base64.b64encode(encoded).decode('utf-8')}"
+                self._pin(digest, owner)
+                self._evict()
+
+        return {"type": "image_url", "image_url": {"url": f"{IMAGE_REF_PREFIX}{digest}"}}
+
+    def add_file(self, path, mime=None, owner=None):
+        with open(path, "rb") as f:
+            return self.add(f.read(), mime=mime, owner=owner)
+
+    def payload(self, digest):
+        """
+        Returns the cached data URL of an image reference, or None if it isn't cached.
+        """
+        return self._payloads.get(digest)
+
+    def restore(self, digest, payload, owner=None):
+        """
+        Puts back a payload saved with `payload`, e.g. when resuming a checkpointed build.
+        """
+        with self._lock:
+            self._payloads[digest] = payload
+            self._payloads.move_to_end(digest)
+            self._pin(digest, owner)
+            self._evict()
+
+    def release(self, owner):
+        """
+        Unpins the images of `owner`, e.g. when its chat session ends. They stay cached
+        until newer images push them out.
+        """
+        with self._lock:
+            self._pins.pop(owner, None)
+            self._evict()
+
+    def _resolve_part(self, part, vision):
+        url = part.get("image_url", {}).get("url", "") if part.get("type") == "image_url" else ""
+        if not url.startswith(IMAGE_REF_PREFIX):
+            return part
+
+        digest = url[len(IMAGE_REF_PREFIX):]
+        payload = self._payloads.get(digest)
+        if vision and payload:
+            return {"type": "image_url", "image_url": {"url": payload}}
+        if vision:
+            logger.warning("ImageCache: image %s is no longer cached, sending a placeholder instead", digest[:12])
+        return {"type": "text", "text": f"[Image {digest[:12]} was attached by the user and is omitted here.]"}
+
+    def resolve(self, messages, vision=True):
+        """
+        Returns a copy of the messages with image references replaced, ready to send.
+        """
+        resolved = []
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, list):
+                message = {**message, "content": [self._resolve_part(part, vision) for part in content]}
+            resolved.append(message)
+        return resolved
+
+
+# Shared so an image uploaded once is encoded once per process
+image_cache = ImageCache()
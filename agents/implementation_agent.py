@@ -1,9 +1,19 @@
+import logging
+
 from agents.base_agent import Agent
-import chainlit as cl
-import os
-import json
+from agents.scheduler import PRIORITY_GENERATION
+from agents.budget import BudgetExceeded
+from agents.artifact_writer import ArtifactWriter
+
+logger = logging.getLogger(__name__)
 
 class ImplementationAgent(Agent):
+    route = "implementation"
+    priority = PRIORITY_GENERATION
+
+    # Works from the plan, so the screenshot isn't re-sent on every implementation call
+    vision = False
+
     tools = [
         {
             "type": "function",
@@ -26,11 +36,46 @@ class ImplementationAgent(Agent):
                     "additionalProperties": False,
                 },
             }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "patchArtifact",
+                "description": "Change part of an existing artifact file. Prefer this over updateArtifact for small changes.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "filename": {
+                            "type": "string",
+                            "description": "The name of the file to patch.",
+                        },
+                        "edits": {
+                            "type": "array",
+                            "description": "Search/replace edits applied in order. Each search text must match exactly once in the file.",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "search": {"type": "string", "description": "The exact text to find, with enough context to be unique."},
+                                    "replace": {"type": "string", "description": "The text to replace it with."},
+                                },
+                                "required": ["search", "replace"],
+                                "additionalProperties": False,
+                            },
+                        },
+                        "diff": {
+                            "type": "string",
+                            "description": "A unified diff of the file, used instead of edits.",
+                        },
+                    },
+                    "required": ["filename"],
+                    "additionalProperties": False,
+                },
+            }
         }
     ]
-    def __init__(self, name, client, prompt="", gen_kwargs=None):
+    def __init__(self, name, client=None, prompt="", gen_kwargs=None, artifact_store=None, context_window=None, tool_executor=None, max_iterations=None, context_builder=None):
 
-        super().__init__(name, client, prompt=prompt, gen_kwargs=gen_kwargs)
+        super().__init__(name, client, prompt=prompt, gen_kwargs=gen_kwargs, artifact_store=artifact_store, context_window=context_window, tool_executor=tool_executor, max_iterations=max_iterations, context_builder=context_builder)
     
     async def execute(self, message_history):
         """
@@ -38,16 +83,16 @@ class ImplementationAgent(Agent):
 
         Note: probably shouldn't couple this with chainlit, but this is just a prototype.
         """
-        print(f"{self.__class__.__name__}: Inside the execution and processing the request")  
+        logger.debug("%s: Inside the execution and processing the request", self.__class__.__name__)
         copied_message_history = message_history.copy()
 
         # Check if the first message is a system prompt
         if copied_message_history and copied_message_history[0]["role"] == "system":
             # Replace the system prompt with the agent's prompt
-            copied_message_history[0] = {"role": "system", "content": self._build_system_prompt()}
+            copied_message_history[0] = {"role": "system", "content": self._build_system_prompt(message_history)}
         else:
             # Insert the agent's prompt at the beginning
-            copied_message_history.insert(0, {"role": "system", "content": self._build_system_prompt()})
+            copied_message_history.insert(0, {"role": "system", "content": self._build_system_prompt(message_history)})
 
         response_message, function_data = await self.handle_tool_calls(copied_message_history)
         #print(f"{self.__class__.__name__}: Function data: ", function_data)
@@ -55,37 +100,37 @@ class ImplementationAgent(Agent):
         if response_message.content:
             message_history.append({"role": "assistant", "content": response_message.content})
             copied_message_history.append({"role": "assistant", "content": response_message.content})
-            cl.user_session.set("message_history", message_history)
+            self.ui.save_history(message_history)
 
         #print(f"DEBUG: function_data: {function_data}")
-        while function_data:
-            print(f"{self.__class__.__name__}: Received Function data just inside while loop: ", function_data)
-            for index, index_data in function_data.items():
-                if "updateArtifact" == index_data["name"]:
-                    arguments_dict = json.loads(index_data["arguments"])
-                    filename = arguments_dict.get("filename")
-                    contents = arguments_dict.get("contents")
-                    print(f"{self.__class__.__name__}: Updating artifacts: {filename} inside agent") 
-                    
-                    if filename and contents:
-                        os.makedirs("artifacts", exist_ok=True)
-                        with open(os.path.join("artifacts", filename), "w") as file:
-                            file.write(contents)
-                        
+        iteration = 0
+        try:
+            while function_data:
+                iteration += 1
+                self._check_loop(iteration, function_data)
+                logger.debug("%s: Received Function data just inside while loop: %s", self.__class__.__name__, function_data)
+                # Tool calls of the same turn run concurrently and their writes are flushed
+                # as one batch, so a file saved twice in a turn is only written once
+                writer = ArtifactWriter(self.artifact_store)
+                notes = await self.tool_executor.run(function_data, lambda index_data: self._apply_artifact_tool(index_data, writer))
+                await writer.flush()
+                for note in notes:
+                    if note:
                         # Add a message to the message history
-                        message_history.append({"role": "system", "content": f"The artifact '{filename}' was updated."})
-                        copied_message_history.append({"role": "system", "content": f"The artifact '{filename}' was updated."})
-            
-                        
-            response_message, function_data = await self.handle_tool_calls(copied_message_history)
-            print(f"{self.__class__.__name__}: Function data in loop: ", function_data)
-            print(f"{self.__class__.__name__}: Response text in loop: ", response_message.content)
-            if response_message.content:
-                message_history.append({"role": "assistant", "content": response_message.content})
-                copied_message_history.append({"role": "assistant", "content": response_message.content})
-                cl.user_session.set("message_history", message_history)
-        else:
-            print("No tool call")
+                        message_history.append({"role": "system", "content": note})
+                        copied_message_history.append({"role": "system", "content": note})
+
+                response_message, function_data = await self.handle_tool_calls(copied_message_history)
+                logger.debug("%s: Function data in loop: %s", self.__class__.__name__, function_data)
+                logger.debug("%s: Response text in loop: %s", self.__class__.__name__, response_message.content)
+                if response_message.content:
+                    message_history.append({"role": "assistant", "content": response_message.content})
+                    copied_message_history.append({"role": "assistant", "content": response_message.content})
+                    self.ui.save_history(message_history)
+            else:
+                logger.debug("No tool call")
+        except BudgetExceeded as e:
+            return await self._stop(e, message_history)
 
         return response_message.content
 
@@ -0,0 +1,253 @@
+import re
+import json
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_STRING_SPECIAL = re.compile(r'["\\]')
+_SKIP_SPECIAL = re.compile(r'["{}\[\]]')
+
+
+class ArgumentStream:
+    """
+    Incremental parser for the JSON arguments of one streamed tool call.
+
+    Fed the argument fragments as they arrive, it decodes the top-level string values
+    character by character, so `value("filename")` is known as soon as its closing quote
+    arrives and `value("contents")` grows with the stream. Nested values such as patch
+    edits are only skipped over; they are read from the complete arguments at the end.
+    Parsing stops at the first syntax error, `error` then holds its offset.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.complete = set()
+        self.closed = False
+        self.error = None
+        self.length = 0
+        self._state = "start"
+        self._key = None
+        # The list the characters of the current string go to
+        self._target = None
+        # Characters of an escape sequence split across fragments, e.g. "u00"
+        self._escape = None
+        self._surrogates = False
+        # Nesting depth of a skipped value and whether the skipper is inside a string
+        self._depth = 0
+        self._skip_string = False
+        self._skip_escape = False
+
+    def value(self, key):
+        """
+        Returns the (possibly partial) string value of `key`, or None if it hasn't started.
+        """
+        parts = self.values.get(key)
+        if parts is None:
+            return None
+        text = "".join(parts)
+        if self._surrogates:
+            text = text.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+        return text
+
+    def _fail(self, offset):
+        self.error = self.length + offset
+        self._state = "error"
+
+    def _end_string(self):
+        if self._state == "key":
+            self._key = "".join(self._target)
+            self._state = "colon"
+        else:
+            self.complete.add(self._key)
+            self._state = "after_value"
+        self._target = None
+
+    def _feed_escape(self, text, i):
+        self._escape += text[i]
+        i += 1
+        if self._escape[0] == "u":
+            if len(self._escape) < 5:
+                return i
+            try:
+                char = chr(int(self._escape[1:], 16))
+            except ValueError:
+                self._fail(i)
+                return len(text)
+            self._surrogates = self._surrogates or 0xD800 <= ord(char) < 0xE000
+        else:
+            char = _ESCAPES.get(self._escape, self._escape)
+        self._escape = None
+        self._target.append(char)
+        return i
+
+    def _feed_skip(self, text, i):
+        """
+        Skips over a nested value, returning the offset after it or the end of the text.
+        """
+        n = len(text)
+        while i < n:
+            if self._skip_escape:
+                self._skip_escape = False
+                i += 1
+            elif self._skip_string:
+                match = _STRING_SPECIAL.search(text, i)
+                if not match:
+                    return n
+                i = match.end()
+                if match.group() == '"':
+                    self._skip_string = False
+                else:
+                    self._skip_escape = True
+            else:
+                match = _SKIP_SPECIAL.search(text, i)
+                if not match:
+                    return n
+                i = match.end()
+                char = match.group()
+                if char == '"':
+                    self._skip_string = True
+                elif char in "{[":
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._state = "after_value"
+                        return i
+        return i
+
+    def feed(self, text):
+        """
+        Parses the next fragment of the arguments.
+        """
+        i, n = 0, len(text)
+        while i < n and self._state not in ("end", "error"):
+            if self._escape is not None:
+                i = self._feed_escape(text, i)
+                continue
+
+            state = self._state
+            if state in ("key", "string"):
+                match = _STRING_SPECIAL.search(text, i)
+                end = match.start() if match else n
+                if end > i:
+                    self._target.append(text[i:end])
+                if not match:
+                    break
+                i = end + 1
+                if match.group() == '"':
+                    self._end_string()
+                else:
+                    self._escape = ""
+                continue
+
+            if state == "skip":
+                i = self._feed_skip(text, i)
+                continue
+
+            char = text[i]
+            i += 1
+            if char.isspace():
+                continue
+
+            if state == "start":
+                if char != "{":
+                    self._fail(i - 1)
+                else:
+                    self._state = "key_or_end"
+            elif state == "key_or_end":
+                if char == '"':
+                    self._state = "key"
+                    self._target = []
+                elif char == "}":
+                    self._state = "end"
+                else:
+                    self._fail(i - 1)
+            elif state == "colon":
+                if char != ":":
+                    self._fail(i - 1)
+                else:
+                    self._state = "value"
+            elif state == "value":
+                if char == '"':
+                    self._state = "string"
+                    self._target = self.values[self._key] = []
+                elif char in "{[":
+                    self._state = "skip"
+                    self._depth = 1
+                else:
+                    self._state = "scalar"
+            elif state == "scalar":
+                if char in ",}":
+                    self._state = "key_or_end" if char == "," else "end"
+            elif state == "after_value":
+                if char == ",":
+                    self._state = "key_or_end"
+                elif char == "}":
+                    self._state = "end"
+                else:
+                    self._fail(i - 1)
+
+        self.length += n
+        self.closed = self._state == "end"
+
+
+def _salvage(text):
+    """
+    Closes the longest prefix of `text` that ends after a complete value inside the
+    top-level object and parses it. Returns None if no such prefix parses.
+    """
+    stack = []
+    safe_points = []
+    in_string = escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if not stack or stack.pop() != char:
+                break
+            if stack:
+                safe_points.append((i + 1, "".join(reversed(stack))))
+        elif char == "," and stack:
+            safe_points.append((i, "".join(reversed(stack))))
+
+    # Try the last few, a syntax error near the end can make the latest ones unusable
+    for end, closers in reversed(safe_points[-5:]):
+        try:
+            return json.loads(text[:end] + closers)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def parse_arguments(text):
+    """
+    Parses the JSON arguments of a tool call. Returns (arguments, truncated).
+
+    Arguments that aren't valid JSON, typically because the output was cut off, are
+    salvaged: every value that arrived complete is kept and the rest is dropped, so a
+    partial list of patch edits still holds its complete edits. Top-level strings count as
+    complete by the same rule as `ArgumentStream.complete`, which decides whether a draft
+    is kept. `arguments` is an empty dict when nothing could be salvaged.
+    """
+    try:
+        arguments = json.loads(text or "{}")
+    except json.JSONDecodeError:
+        pass
+    else:
+        return (arguments, False) if isinstance(arguments, dict) else ({}, True)
+
+    arguments = _salvage(text)
+    if not isinstance(arguments, dict):
+        arguments = {}
+    stream = ArgumentStream()
+    stream.feed(text)
+    for key in stream.complete:
+        arguments.setdefault(key, stream.value(key))
+    return arguments, True
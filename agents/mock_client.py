@@ -0,0 +1,98 @@
+import asyncio
+import json
+from collections import deque
+from types import SimpleNamespace
+
+from agents.chunks import make_chunk
+from agents.response_cache import ResponseCache
+
+
+def response_to_records(response, chunk_size=16):
+    """
+    Splits a scripted response into streamed deltas.
+
+    A response is either a string (plain text) or a dict with optional "content" and
+    "tool_calls" ([{"name": ..., "arguments": ...}]); arguments may be a JSON string or a
+    dict. Lists are taken to be already-recorded deltas and returned unchanged.
+    """
+    if isinstance(response, list):
+        return response
+    if isinstance(response, str):
+        response = {"content": response}
+
+    records = []
+    content = response.get("content") or ""
+    for i in range(0, len(content), chunk_size):
+        records.append({"content": content[i:i + chunk_size], "tool_calls": []})
+
+    for index, tool_call in enumerate(response.get("tool_calls") or []):
+        arguments = tool_call.get("arguments", "")
+        if not isinstance(arguments, str):
+            arguments = json.dumps(arguments)
+
+        records.append({"content": None, "tool_calls": [
+            {"index": index, "id": f"call_{index}", "name": tool_call["name"], "arguments": ""},
+        ]})
+        for i in range(0, len(arguments), chunk_size):
+            records.append({"content": None, "tool_calls": [
+                {"index": index, "id": None, "name": None, "arguments": arguments[i:i + chunk_size]},
+            ]})
+    return records
+
+
+class MockAsyncOpenAI:
+    """
+    Offline stand-in for AsyncOpenAI that streams scripted or recorded responses.
+
+    Responses come from `script` in order (see `response_to_records` for the format) or,
+    when a `responder` is given, from `responder(request_kwargs)`. Streams wait
+    `first_token_latency` seconds before the first chunk and `chunk_latency` between
+    chunks. Every request is kept in `requests` for inspection.
+    """
+
+    def __init__(self, script=None, responder=None, first_token_latency=0.0, chunk_latency=0.0, chunk_size=16):
+        self.script = deque(script or [])
+        self.responder = responder
+        self.first_token_latency = first_token_latency
+        self.chunk_latency = chunk_latency
+        self.chunk_size = chunk_size
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    @classmethod
+    def from_cache(cls, directory, **kwargs):
+        """
+        Replays responses recorded by a ResponseCache, matched on the exact request.
+        """
+        cache = ResponseCache(directory, ttl_seconds=float("inf"))
+
+        def responder(request):
+            records = cache.get(cache.key(request))
+            if records is None:
+                raise LookupError("No recorded response for this request")
+            return records
+
+        return cls(responder=responder, **kwargs)
+
+    async def _create(self, **kwargs):
+        self.requests.append(kwargs)
+        if self.responder:
+            response = self.responder(kwargs)
+        elif self.script:
+            response = self.script.popleft()
+        else:
+            raise LookupError(f"Mock client script exhausted after {len(self.requests) - 1} requests")
+
+        records = response_to_records(response, chunk_size=self.chunk_size)
+        if not kwargs.get("stream"):
+            content = "".join(record.get("content") or "" for record in records)
+            message = SimpleNamespace(content=content, tool_calls=None)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=None)
+        return self._stream(records)
+
+    async def _stream(self, records):
+        await asyncio.sleep(self.first_token_latency)
+        for i, record in enumerate(records):
+            if i and self.chunk_latency:
+                await asyncio.sleep(self.chunk_latency)
+            yield make_chunk(record.get("content"), record.get("tool_calls"))
@@ -0,0 +1,80 @@
+import os
+import logging
+
+from agents.plan import next_milestone, parse_milestones
+from agents.review import APPROVED, CHANGES_REQUESTED, parse_verdict
+
+logger = logging.getLogger(__name__)
+
+# Returned by Orchestrator.decide when the build is complete
+DONE = "done"
+
+
+class Orchestrator:
+    """
+    Deterministic stand-in for the supervisor LLM's routing decisions.
+
+    The supervisor prompt describes a fixed cycle: plan, then implement and review one
+    milestone at a time, reimplementing until the reviewer approves. `decide` follows that
+    cycle from the milestones in plan.md and the reviewer's verdicts, and returns None
+    whenever the next step isn't clear, so the supervisor LLM decides instead:
+
+    - a new user message on an existing plan (it could be feedback on anything)
+    - the planning agent finished without saving a plan with milestones
+    - a review without a clear verdict
+    - a milestone rejected more than `max_revisions` times in a row
+    """
+
+    def __init__(self, plan_filename="plan.md", max_revisions=3):
+        self.plan_filename = plan_filename
+        self.max_revisions = max_revisions
+
+    def decide(self, store, calls):
+        """
+        Returns the name of the next agent to call, DONE, or None to ask the LLM.
+
+        `calls` holds (agent_name, response) for each agent called so far in this run.
+        """
+        milestones = parse_milestones(store.read(self.plan_filename))
+
+        if not calls:
+            return "planning" if not milestones else None
+
+        agent_name, response = calls[-1]
+        if agent_name == "planning":
+            return "implementation" if next_milestone(milestones) else None
+        if agent_name == "implementation":
+            return "reviewer"
+        if agent_name != "reviewer":
+            return None
+
+        verdict = parse_verdict(response)
+        logger.debug("Orchestrator: reviewer verdict %s", verdict)
+        if verdict == APPROVED:
+            return "implementation" if next_milestone(milestones) else DONE
+        if verdict == CHANGES_REQUESTED and self._revisions(calls) <= self.max_revisions:
+            return "implementation"
+        return None
+
+    def _revisions(self, calls):
+        """
+        Counts how many reviews in a row, up to the latest, requested changes.
+        """
+        count = 0
+        for agent_name, response in reversed(calls):
+            if agent_name != "reviewer":
+                continue
+            if parse_verdict(response) != CHANGES_REQUESTED:
+                break
+            count += 1
+        return count
+
+
+def orchestrator_from_env():
+    """
+    Returns an Orchestrator when SUPERVISOR_MODE is "rules", otherwise None so every
+    routing decision goes to the supervisor LLM.
+    """
+    if os.getenv("SUPERVISOR_MODE", "llm") != "rules":
+        return None
+    return Orchestrator(max_revisions=int(os.getenv("SUPERVISOR_MAX_REVISIONS", "3")))
@@ -0,0 +1,102 @@
+import re
+
+
+class PatchConflict(Exception):
+    """
+    Raised when a patch does not apply cleanly to the current contents of an artifact.
+    """
+
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def apply_search_replace(text, edits):
+    """
+    Applies search/replace edits in order. Each search string must match exactly once.
+    """
+    for i, edit in enumerate(edits):
+        search = edit.get("search", "")
+        replace = edit.get("replace", "")
+        if not search:
+            raise PatchConflict(f"edit {i + 1} has an empty search string")
+
+        count = text.count(search)
+        if count == 0:
+            raise PatchConflict(f"edit {i + 1}: search text not found")
+        if count > 1:
+            raise PatchConflict(f"edit {i + 1}: search text matches {count} places, add more context")
+        text = text.replace(search, replace, 1)
+    return text
+
+
+def _parse_hunks(diff):
+    hunks = []
+    current = None
+    for line in diff.splitlines():
+        if line.startswith(("---", "+++")) and current is None:
+            continue
+        match = HUNK_HEADER.match(line)
+        if match:
+            current = {"start": int(match.group(1)), "old": [], "new": []}
+            hunks.append(current)
+        elif current is not None:
+            if line.startswith("-"):
+                current["old"].append(line[1:])
+            elif line.startswith("+"):
+                current["new"].append(line[1:])
+            elif line.startswith(" ") or line == "":
+                current["old"].append(line[1:])
+                current["new"].append(line[1:])
+            # "\ No newline at end of file" and anything else is ignored
+    if not hunks:
+        raise PatchConflict("diff contains no hunks")
+    return hunks
+
+
+def _find_block(lines, block, expected, lower_bound):
+    """
+    Finds `block` in `lines` at or after `lower_bound`, preferring the position closest to
+    `expected` so line numbers that drifted a little still apply.
+    """
+    if not block:
+        return max(min(expected, len(lines)), lower_bound)
+
+    candidates = [
+        i for i in range(lower_bound, len(lines) - len(block) + 1)
+        if lines[i:i + len(block)] == block
+    ]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda i: abs(i - expected))
+
+
+def apply_unified_diff(text, diff):
+    """
+    Applies a unified diff. Hunks are matched on their context and removed lines rather
+    than trusting line numbers; a hunk that can't be found raises PatchConflict.
+    """
+    lines = text.split("\n")
+    offset = 0
+    lower_bound = 0
+    for i, hunk in enumerate(_parse_hunks(diff)):
+        # "-N,0" inserts after line N, any other hunk starts at line N
+        expected = max(hunk["start"] - (1 if hunk["old"] else 0) + offset, 0)
+        position = _find_block(lines, hunk["old"], expected, lower_bound)
+        if position is None:
+            raise PatchConflict(f"hunk {i + 1} does not match the current file")
+
+        lines[position:position + len(hunk["old"])] = hunk["new"]
+        offset += len(hunk["new"]) - len(hunk["old"])
+        lower_bound = position + len(hunk["new"])
+    return "\n".join(lines)
+
+
+def apply_patch(text, edits=None, diff=None):
+    """
+    Applies either search/replace edits or a unified diff to the given text.
+    """
+    if edits:
+        return apply_search_replace(text, edits)
+    if diff:
+        return apply_unified_diff(text, diff)
+    raise PatchConflict("the patch has neither edits nor a diff")
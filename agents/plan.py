@@ -0,0 +1,57 @@
+import re
+from collections import namedtuple
+
+Milestone = namedtuple("Milestone", ["number", "title", "done"])
+
+# " - [ ] 1. Build the header" or " - [x] 2. Add the footer"
+MILESTONE_PATTERN = re.compile(r"^\s*[-*]\s*\[([ xX])\]\s*(\d+)\.?\s*(.*?)\s*$", re.MULTILINE)
+
+
+def parse_milestones(plan):
+    """
+    Returns the milestones of a plan.md, in the order they appear.
+    """
+    if not plan:
+        return []
+    return [
+        Milestone(int(number), title, mark != " ")
+        for mark, number, title in MILESTONE_PATTERN.findall(plan)
+    ]
+
+
+def next_milestone(milestones):
+    """
+    Returns the first milestone that isn't checked off, or None when all are done.
+    """
+    return next((milestone for milestone in milestones if not milestone.done), None)
+
+
+def milestone_sections(plan):
+    """
+    Returns (milestone, text) pairs, where text is the milestone's checkbox line together
+    with any detail lines that follow it, up to the next milestone or heading.
+    """
+    if not plan:
+        return []
+    matches = list(MILESTONE_PATTERN.finditer(plan))
+    sections = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(plan)
+        heading = re.search(r"^#", plan[match.end():end], re.MULTILINE)
+        if heading:
+            end = match.end() + heading.start()
+        mark, number, title = match.groups()
+        sections.append((Milestone(int(number), title, mark != " "), plan[match.start():end].strip("\n")))
+    return sections
+
+
+def plan_overview(plan):
+    """
+    Returns the part of the plan before its milestones.
+    """
+    if not plan:
+        return ""
+    match = MILESTONE_PATTERN.search(plan)
+    overview = plan[:match.start()] if match else plan
+    # Drop the "Milestones" heading that introduces the list
+    return re.sub(r"\n#+\s*Milestones\s*$", "", overview.rstrip(), flags=re.IGNORECASE).strip()
@@ -1,11 +1,13 @@
-import os
-import json
+import logging
 
 from agents.base_agent import Agent
-import chainlit as cl
+
+logger = logging.getLogger(__name__)
 
 
 class PlanningAgent(Agent):
+    route = "planning"
+
     tools = [
         {
             "type": "function",
@@ -28,11 +30,46 @@ class PlanningAgent(Agent):
                     "additionalProperties": False,
                 },
             }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "patchArtifact",
+                "description": "Change part of an existing artifact file which is markdown. Prefer this over updateArtifact for small changes.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "filename": {
+                            "type": "string",
+                            "description": "The name of the file to patch.",
+                        },
+                        "edits": {
+                            "type": "array",
+                            "description": "Search/replace edits applied in order. Each search text must match exactly once in the file.",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "search": {"type": "string", "description": "The exact text to find, with enough context to be unique."},
+                                    "replace": {"type": "string", "description": "The text to replace it with."},
+                                },
+                                "required": ["search", "replace"],
+                                "additionalProperties": False,
+                            },
+                        },
+                        "diff": {
+                            "type": "string",
+                            "description": "A unified diff of the file, used instead of edits.",
+                        },
+                    },
+                    "required": ["filename"],
+                    "additionalProperties": False,
+                },
+            }
         }
     ]
-    def __init__(self, name, client, prompt="", gen_kwargs=None):
+    def __init__(self, name, client=None, prompt="", gen_kwargs=None, artifact_store=None, context_window=None, tool_executor=None, max_iterations=None, context_builder=None):
 
-        super().__init__(name, client, prompt=prompt, gen_kwargs=gen_kwargs)
+        super().__init__(name, client, prompt=prompt, gen_kwargs=gen_kwargs, artifact_store=artifact_store, context_window=context_window, tool_executor=tool_executor, max_iterations=max_iterations, context_builder=context_builder)
 
     async def execute(self, message_history):
         """
@@ -40,7 +77,7 @@ class PlanningAgent(Agent):
 
         Note: probably shouldn't couple this with chainlit, but this is just a prototype.
         """
-        print(f"{self.__class__.__name__}: Inside the execution and processing the request")  
+        logger.debug("%s: Inside the execution and processing the request", self.__class__.__name__)
         copied_message_history = message_history.copy()
 
         # Check if the first message is a system prompt
@@ -58,38 +95,29 @@ class PlanningAgent(Agent):
         if response_message.content:
             message_history.append({"role": "assistant", "content": response_message.content})
             copied_message_history.append({"role": "assistant", "content": response_message.content})
-            cl.user_session.set("message_history", message_history)      
+            self.ui.save_history(message_history)
         
         #print(f"DEBUG: function_data: {function_data}")
         if function_data:
-            print(f"{self.__class__.__name__}: Received Function data just inside while loop: ", function_data)
+            logger.debug("%s: Received Function data just inside while loop: %s", self.__class__.__name__, function_data)
             for index, index_data in function_data.items():
-                if "updateArtifact" == index_data["name"]:
-                    arguments_dict = json.loads(index_data["arguments"])
-                    filename = arguments_dict.get("filename")
-                    contents = arguments_dict.get("contents")
-                    print(f"{self.__class__.__name__}: Updating artifacts: {filename} inside agent") 
-                    
-                    if filename and contents:
-                        os.makedirs("artifacts", exist_ok=True)
-                        with open(os.path.join("artifacts", filename), "w") as file:
-                            file.write(contents)
-                        
-                        # Add a message to the message history
-                        message_history.append({"role": "system", "content": f"The artifact '{filename}' was updated."})
-                        copied_message_history.append({"role": "system", "content": f"The artifact '{filename}' was updated."})
-                        response_message, function_data = await self.handle_tool_calls(message_history, call_tools=False)
-                        print(f"{self.__class__.__name__}: Function data after updating artifact: ", function_data)
-                        print(f"{self.__class__.__name__}: Response text after updating artifact: ", response_message.content)
-                        if response_message.content:
-                            message_history.append({"role": "assistant", "content": response_message.content})
-                            copied_message_history.append({"role": "assistant", "content": response_message.content})
-                            cl.user_session.set("message_history", message_history)
+                note = await self._apply_artifact_tool(index_data)
+                if note:
+                    # Add a message to the message history
+                    message_history.append({"role": "system", "content": note})
+                    copied_message_history.append({"role": "system", "content": note})
+                    response_message, function_data = await self.handle_tool_calls(message_history, call_tools=False)
+                    logger.debug("%s: Function data after updating artifact: %s", self.__class__.__name__, function_data)
+                    logger.debug("%s: Response text after updating artifact: %s", self.__class__.__name__, response_message.content)
+                    if response_message.content:
+                        message_history.append({"role": "assistant", "content": response_message.content})
+                        copied_message_history.append({"role": "assistant", "content": response_message.content})
+                        self.ui.save_history(message_history)
 
         else:
-            print("No tool call")
+            logger.debug("No tool call")
 
-        print(f"{self.__class__.__name__}: Response from planning agent after creating and saving: {response_message.content}") 
+        logger.debug("%s: Response from planning agent after creating and saving: %s", self.__class__.__name__, response_message.content)
         return response_message.content
 
 
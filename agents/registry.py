@@ -0,0 +1,52 @@
+class AgentRegistry:
+    """
+    The agents the supervisor can call, keyed by the name the model uses in callAgent.
+
+    Only a factory is registered for each agent, and the agent is built the first time
+    it is looked up, so importing the module that defines them costs nothing and agents a
+    process never calls are never built. Lookups behave like a dict's.
+    """
+
+    def __init__(self, factories=None):
+        self._factories = dict(factories or {})
+        self._agents = {}
+
+    def register(self, name, factory):
+        """
+        Registers (or replaces) the factory of an agent. It is called without arguments.
+        """
+        self._factories[name] = factory
+        self._agents.pop(name, None)
+
+    def get(self, name, default=None):
+        """
+        Returns the named agent, building it on first use, or `default` if there is none.
+        """
+        agent = self._agents.get(name)
+        if agent is None:
+            factory = self._factories.get(name)
+            if factory is None:
+                return default
+            agent = self._agents[name] = factory()
+        return agent
+
+    def __getitem__(self, name):
+        agent = self.get(name)
+        if agent is None:
+            raise KeyError(name)
+        return agent
+
+    def __contains__(self, name):
+        return name in self._factories
+
+    def __iter__(self):
+        return iter(self._factories)
+
+    def __len__(self):
+        return len(self._factories)
+
+    def built(self):
+        """
+        Names of the agents built so far.
+        """
+        return list(self._agents)
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+from agents.budget import get_current_budget
+from agents.chunks import chunk_to_record, replay
+
+
+class ResponseCache:
+    """
+    On-disk, content-addressed cache of streamed chat completions.
+
+    Each entry is a JSON file named after the hash of the request and holds the recorded
+    deltas (text and tool call fragments). Entries older than `ttl_seconds` are ignored
+    and removed, and the least recently used entries are evicted beyond `max_entries`.
+    The number of entries is counted as they are written, so the directory is only scanned
+    when there are too many. Its methods block, so async code calls them in a thread.
+    """
+
+    def __init__(self, directory, max_entries=512, ttl_seconds=24 * 60 * 60):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Entries on disk, counted on the first write
+        self._entries = None
+
+    @staticmethod
+    def key(request):
+        payload = json.dumps(request, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                os.remove(path)
+                with self._lock:
+                    if self._entries:
+                        self._entries -= 1
+                raise FileNotFoundError(path)
+            with open(path, "r") as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # Touch the entry so eviction is least-recently-used rather than oldest-written
+        os.utime(path)
+        self.hits += 1
+        return records
+
+    def set(self, key, records):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(records, f)
+        path = self._path(key)
+        with self._lock:
+            new = not os.path.exists(path)
+            os.replace(tmp_path, path)
+            if self._entries is None:
+                self._entries = self._count()
+            elif new:
+                self._entries += 1
+            if self._entries > self.max_entries:
+                self._evict()
+
+    def _count(self):
+        return sum(1 for entry in os.scandir(self.directory) if entry.name.endswith(".json"))
+
+    def _evict(self):
+        # Rescanned rather than trusting the count, which misses writes by other processes
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+        self._entries = min(len(entries), self.max_entries)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate()}
+
+
+class CachingClient:
+    """
+    Wraps an AsyncOpenAI client so streamed `chat.completions.create` calls are served
+    from a ResponseCache when the exact same request was made before.
+
+    Cached responses are replayed as a stream of chunk objects, so callers consume them
+    exactly like a live response. A live response is only stored once it has streamed to
+    the end. Everything other than streamed chat completions passes straight through.
+    """
+
+    def __init__(self, client, cache):
+        self.client = client
+        self.cache = cache
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def _create(self, **kwargs):
+        if not kwargs.get("stream"):
+            return await self.client.chat.completions.create(**kwargs)
+
+        key = self.cache.key(kwargs)
+        records = await asyncio.to_thread(self.cache.get, key)
+        budget = get_current_budget()
+        if budget:
+            budget.record_response_cache(records is not None)
+        if records is not None:
+            return replay(records)
+
+        stream = await self.client.chat.completions.create(**kwargs)
+        return self._record(stream, key)
+
+    async def _record(self, stream, key):
+        records = []
+        async for part in stream:
+            records.append(chunk_to_record(part))
+            yield part
+        await asyncio.to_thread(self.cache.set, key, records)
+
+
+# The cache in front of the shared client, if RESPONSE_CACHE_DIR is set
+_shared_cache = None
+
+
+def response_cache_stats():
+    """
+    Returns the hits, misses and hit rate of the response cache across the process, or
+    None when no response cache is configured.
+    """
+    return _shared_cache.stats() if _shared_cache else None
+
+
+def cached_client_from_env(client):
+    """
+    Wraps the client with a response cache when RESPONSE_CACHE_DIR is set.
+    """
+    global _shared_cache
+    directory = os.getenv("RESPONSE_CACHE_DIR")
+    if not directory:
+        return client
+
+    cache = ResponseCache(
+        directory,
+        max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512")),
+        ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(24 * 60 * 60))),
+    )
+    _shared_cache = cache
+    return CachingClient(client, cache)
@@ -0,0 +1,92 @@
+import re
+
+APPROVED = "approved"
+CHANGES_REQUESTED = "changes_requested"
+
+# Summary of a review rejected by the static checks, before any LLM call
+STATIC_CHECKS_FAILED = "The automated checks found problems that have to be fixed first."
+
+# First line of every review formatted by `format_review`, naming the milestone if known
+_VERDICT_LINE_PATTERN = re.compile(r"^Verdict: (approved|changes requested)\b(?: \(milestone (\d+)\))?", re.IGNORECASE)
+
+_REJECTED_PATTERN = re.compile(r"\bnot (yet )?(been )?approved\b", re.IGNORECASE)
+_APPROVED_PATTERN = re.compile(
+    r"\b(approved?|looks good|lgtm|well done|meets (all )?(of )?the requirements|no (further )?changes (are )?(needed|required))\b",
+    re.IGNORECASE,
+)
+_CHANGES_PATTERN = re.compile(
+    r"\b(changes (are )?(requested|needed|required)|needs? (to be )?(improv|fix|updat|chang|re-?implement)"
+    r"|not (been )?(marked|implemented|checked)|missing|re-?implement|incorrect)",
+    re.IGNORECASE,
+)
+
+
+def format_review(verdict, summary="", issues=None, milestone=None):
+    """
+    Renders a structured review as the text handed back to the supervisor. `milestone` is
+    the number of the reviewed milestone.
+    """
+    lines = [f"Verdict: {verdict.replace('_', ' ')}" + (f" (milestone {milestone})" if milestone is not None else "")]
+    if summary:
+        lines.append(summary.strip())
+    if issues:
+        lines.append("Issues:")
+        for found in issues:
+            prefix = f"{found['file']}: " if found.get("file") else ""
+            lines.append(f" - {prefix}{found['description']}")
+    return "\n".join(lines)
+
+
+def parse_verdict(review):
+    """
+    Reads the verdict out of a review. Reviews made by `format_review` are read from their
+    verdict line; free-text reviews are matched against approval and rejection phrases.
+    Returns APPROVED, CHANGES_REQUESTED, or None when the review says neither or both.
+    """
+    if not review:
+        return None
+    if match := _VERDICT_LINE_PATTERN.match(review.strip()):
+        return APPROVED if match.group(1).lower() == "approved" else CHANGES_REQUESTED
+    if _REJECTED_PATTERN.search(review):
+        return CHANGES_REQUESTED
+
+    approved = bool(_APPROVED_PATTERN.search(review))
+    # Approval phrases such as "no changes needed" must not count as requested changes
+    changes = bool(_CHANGES_PATTERN.search(_APPROVED_PATTERN.sub("", review)))
+    if approved == changes:
+        return None
+    return APPROVED if approved else CHANGES_REQUESTED
+
+
+def latest_review(message_history):
+    """
+    Returns (verdict, milestone number) of the most recent review in the history made by
+    `format_review`, or (None, None) if there is none. The number is None for a review
+    that doesn't name its milestone.
+    """
+    for message in reversed(message_history or []):
+        content = message.get("content")
+        if not isinstance(content, str):
+            continue
+        if match := _VERDICT_LINE_PATTERN.match(content.strip()):
+            verdict = APPROVED if match.group(1).lower() == "approved" else CHANGES_REQUESTED
+            return verdict, int(match.group(2)) if match.group(2) else None
+    return None, None
+
+
+def milestone_in_progress(message_history, milestones):
+    """
+    Returns the milestone the latest implementation step worked on, judged by the latest
+    review: the milestone it sent back, or the one after the milestone it approved. Returns
+    None when the history has no review naming a milestone, or every milestone is approved.
+    """
+    verdict, number = latest_review(message_history)
+    if number is None:
+        return None
+    for i, milestone in enumerate(milestones):
+        if milestone.number != number:
+            continue
+        if verdict == CHANGES_REQUESTED:
+            return milestone
+        return milestones[i + 1] if i + 1 < len(milestones) else None
+    return None
@@ -1,36 +1,142 @@
-import os
 import json
+import logging
 
 from agents.base_agent import Agent
-import chainlit as cl
+from agents.scheduler import PRIORITY_INTERACTIVE
+from agents.plan import parse_milestones
+from agents.review import APPROVED, CHANGES_REQUESTED, STATIC_CHECKS_FAILED, format_review, milestone_in_progress, parse_verdict
+from agents.static_checks import ERROR, run_static_checks
+
+logger = logging.getLogger(__name__)
 
 
 class ReviewerAgent(Agent):
+    route = "reviewer"
+    priority = PRIORITY_INTERACTIVE
+
+    tools = [
+        {
+            "type": "function",
+            "function": {
+                "name": "submitReview",
+                "description": "Submit the review of the latest implemented milestone.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "verdict": {
+                            "type": "string",
+                            "enum": [APPROVED, CHANGES_REQUESTED],
+                            "description": "Whether the milestone is approved or has to be implemented again.",
+                        },
+                        "summary": {
+                            "type": "string",
+                            "description": "A short summary of the review.",
+                        },
+                        "issues": {
+                            "type": "array",
+                            "description": "The problems the engineer has to fix, empty when approved.",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "file": {"type": "string", "description": "The artifact the issue is in."},
+                                    "description": {"type": "string", "description": "What is wrong and what is expected instead."},
+                                },
+                                "required": ["file", "description"],
+                                "additionalProperties": False,
+                            },
+                        },
+                    },
+                    "required": ["verdict", "summary", "issues"],
+                    "additionalProperties": False,
+                },
+            }
+        }
+    ]
+
+    tool_choice = {"type": "function", "function": {"name": "submitReview"}}
+
+    def __init__(self, name, client=None, prompt="", gen_kwargs=None, artifact_store=None, context_window=None, tool_executor=None, max_iterations=None, context_builder=None):
+
+        super().__init__(name, client, prompt=prompt, gen_kwargs=gen_kwargs, artifact_store=artifact_store, context_window=context_window, tool_executor=tool_executor, max_iterations=max_iterations, context_builder=context_builder)
+
+    async def _post(self, review):
+        message = self.ui.new_message()
+        await message.stream_token(review)
+        await message.update()
+
+    def _reviewed_milestone(self, milestones, in_progress):
+        """
+        Returns the number of the milestone under review: the one the latest implementation
+        step worked on, otherwise the last one marked off.
+        """
+        if in_progress is not None:
+            return in_progress.number
+        done = [milestone for milestone in milestones if milestone.done]
+        return done[-1].number if done else None
 
-    def __init__(self, name, client, prompt="", gen_kwargs=None):
+    def _read_review(self, response_message, function_data):
+        """
+        Returns (verdict, summary, issues) from the submitReview call, or from the text of
+        the response if the model answered in prose.
+        """
+        for index_data in function_data.values():
+            if index_data["name"] != "submitReview":
+                continue
+            try:
+                arguments_dict = json.loads(index_data["arguments"])
+            except json.JSONDecodeError:
+                logger.debug("%s: Could not parse submitReview arguments", self.__class__.__name__)
+                continue
+            if arguments_dict.get("verdict") in (APPROVED, CHANGES_REQUESTED):
+                return arguments_dict["verdict"], arguments_dict.get("summary", ""), arguments_dict.get("issues") or []
 
-        super().__init__(name, client, prompt=prompt, gen_kwargs=gen_kwargs)
+        return parse_verdict(response_message.content), response_message.content, []
 
     async def execute(self, message_history):
         """
         Executes the agent's main functionality.
 
-        Note: probably shouldn't couple this with chainlit, but this is just a prototype.
+        Cheap local checks run first; a milestone with errors in them is sent back without
+        an LLM call. Returns the review formatted by `format_review`, naming the reviewed
+        milestone so the next implementation step knows which one to rework.
         """
-        print(f"{self.__class__.__name__}: Inside the execution and processing the request")  
+        logger.debug("%s: Inside the execution and processing the request", self.__class__.__name__)
+
+        milestones = parse_milestones(self.artifact_store.read("plan.md"))
+        in_progress = milestone_in_progress(message_history, milestones)
+        milestone = self._reviewed_milestone(milestones, in_progress)
+        # The milestone the implementation step worked on has to be marked off
+        issues = run_static_checks(self.artifact_store, milestone=in_progress.number if in_progress else None)
+        errors = [found for found in issues if found["severity"] == ERROR]
+        if errors:
+            review = format_review(CHANGES_REQUESTED, STATIC_CHECKS_FAILED, errors, milestone)
+            logger.debug("%s: Rejected by static checks: %s", self.__class__.__name__, errors)
+            await self._post(review)
+            return review
+
         copied_message_history = message_history.copy()
 
         # Check if the first message is a system prompt
         if copied_message_history and copied_message_history[0]["role"] == "system":
             # Replace the system prompt with the agent's prompt
-            copied_message_history[0] = {"role": "system", "content": self._build_system_prompt()}
+            copied_message_history[0] = {"role": "system", "content": self._build_system_prompt(message_history)}
         else:
             # Insert the agent's prompt at the beginning
-            copied_message_history.insert(0, {"role": "system", "content": self._build_system_prompt()})
+            copied_message_history.insert(0, {"role": "system", "content": self._build_system_prompt(message_history)})
+
+        if issues:
+            # Warnings aren't conclusive on their own, so the reviewer weighs them
+            notes = "\n".join(f" - {found['file']}: {found['description']}" for found in issues)
+            copied_message_history.append({"role": "system", "content": f"Automated checks raised these warnings:\n{notes}"})
 
+        response_message, function_data = await self.handle_tool_calls(copied_message_history)
+        verdict, summary, review_issues = self._read_review(response_message, function_data)
+        if verdict is None:
+            # Left to the supervisor to interpret
+            return response_message.content
 
-        response_message, function_data = await self.handle_tool_calls(copied_message_history, call_tools=False)
-        #print(f"{self.__class__.__name__}: Function data: ", function_data)
-        #print(f"{self.__class__.__name__}: Response text: ", response_message.content)
-        print(f"{self.__class__.__name__}: Response from reviewer after reviewing the implementation: {response_message.content}") 
-        return response_message.content
+        review = format_review(verdict, summary, review_issues, milestone)
+        if function_data:
+            await self._post(review)
+        logger.debug("%s: Response from reviewer after reviewing the implementation: %s", self.__class__.__name__, review)
+        return review
@@ -0,0 +1,233 @@
+import asyncio
+import os
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+# Lower runs first. Short routing and review calls go ahead of long code generation.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_GENERATION = 2
+
+
+class TokenBucket:
+    """
+    Holds up to `capacity` units and refills at `capacity` units per minute.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """
+        Seconds until `amount` units are available.
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) * 60 / self.capacity)
+
+    def take(self, amount):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _Waiter:
+    __slots__ = ("session_id", "priority", "tokens", "future", "enqueued", "seq")
+
+    def __init__(self, session_id, priority, tokens, future, seq):
+        self.session_id = session_id
+        self.priority = priority
+        self.tokens = tokens
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.seq = seq
+
+
+class Slot:
+    """
+    Permission to make one LLM call. `settle` corrects the token estimate it was granted
+    with once the real usage is known.
+    """
+
+    def __init__(self, scheduler, tokens, waited):
+        self.scheduler = scheduler
+        self.tokens = tokens
+        self.waited = waited
+
+    def settle(self, tokens):
+        self.scheduler._settle(self.tokens, tokens)
+        self.tokens = tokens
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for LLM calls.
+
+    Calls wait in one queue until the requests-per-minute and tokens-per-minute buckets
+    and the concurrency limit allow them through. The next call is the one with the best
+    (lowest) priority; among equal priorities, the session that has been granted the
+    fewest calls goes first, so one large build can't starve other users. Any limit left
+    as None is not enforced, and without limits `slot` costs nothing.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, max_concurrency=None, recent_waits=1000):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.granted = Counter()
+        self.max_queue_depth = 0
+        self.waits = deque(maxlen=recent_waits)
+        self._queue = []
+        self._seq = 0
+        self._timer = None
+
+    @classmethod
+    def from_env(cls):
+        def number(name):
+            value = os.getenv(name)
+            return int(value) if value else None
+
+        return cls(
+            requests_per_minute=number("LLM_REQUESTS_PER_MINUTE"),
+            tokens_per_minute=number("LLM_TOKENS_PER_MINUTE"),
+            max_concurrency=number("LLM_MAX_CONCURRENCY"),
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.requests or self.tokens or self.max_concurrency)
+
+    @asynccontextmanager
+    async def slot(self, priority=PRIORITY_DEFAULT, tokens=0, session_id=None):
+        """
+        Waits for a turn, then holds a concurrency slot for the duration of the block.
+        """
+        if not self.enabled:
+            yield Slot(self, tokens, 0.0)
+            return
+
+        session_id = session_id or get_current_session_id()
+        loop = asyncio.get_running_loop()
+        self._seq += 1
+        waiter = _Waiter(session_id, priority, tokens, loop.create_future(), self._seq)
+        self._queue.append(waiter)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+        self._dispatch()
+        try:
+            await waiter.future
+        except BaseException:
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+            elif waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as it was cancelled
+                self._release()
+            raise
+
+        waited = time.monotonic() - waiter.enqueued
+        self.waits.append((priority, waited))
+        try:
+            yield Slot(self, tokens, waited)
+        finally:
+            self._release()
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _settle(self, estimated, actual):
+        if not self.tokens:
+            return
+        if actual > estimated:
+            self.tokens.take(actual - estimated)
+        else:
+            self.tokens.give_back(estimated - actual)
+
+    def _next_waiter(self):
+        return min(self._queue, key=lambda waiter: (waiter.priority, self.granted[waiter.session_id], waiter.seq))
+
+    def _dispatch(self):
+        """
+        Grants queued calls for as long as the limits allow, and sets a timer for when the
+        buckets will have refilled enough for the next one.
+        """
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queue:
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                return
+
+            waiter = self._next_waiter()
+            if waiter.future.done():
+                self._queue.remove(waiter)
+                continue
+
+            delay = max(
+                self.requests.wait_time(1) if self.requests else 0.0,
+                self.tokens.wait_time(waiter.tokens) if self.tokens else 0.0,
+            )
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(waiter.tokens)
+            self._queue.remove(waiter)
+            self.in_flight += 1
+            self.granted[waiter.session_id] += 1
+            waiter.future.set_result(None)
+
+    def stats(self):
+        """
+        Queue depth and wait times of recent calls, overall and per priority.
+        """
+        def summarize(waits):
+            waits = sorted(waits)
+            if not waits:
+                return {"calls": 0, "mean_wait": 0.0, "p95_wait": 0.0, "max_wait": 0.0}
+            return {
+                "calls": len(waits),
+                "mean_wait": sum(waits) / len(waits),
+                "p95_wait": waits[min(len(waits) - 1, int(len(waits) * 0.95))],
+                "max_wait": waits[-1],
+            }
+
+        priorities = sorted({priority for priority, _ in self.waits})
+        return {
+            "queue_depth": len(self._queue),
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": self.in_flight,
+            "sessions": len(self.granted),
+            **summarize([waited for _, waited in self.waits]),
+            "by_priority": {priority: summarize([waited for p, waited in self.waits if p == priority]) for priority in priorities},
+        }
+
+
+current_session_id = ContextVar("current_session_id", default="default")
+
+
+def get_current_session_id():
+    return current_session_id.get()
+
+
+def use_session_id(session_id):
+    return current_session_id.set(session_id)
+
+
+scheduler = LLMScheduler.from_env()
@@ -0,0 +1,198 @@
+import re
+from html.parser import HTMLParser
+
+from agents.plan import parse_milestones
+
+ERROR = "error"
+WARNING = "warning"
+
+# Elements that never have an end tag
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr",
+}
+
+# Elements whose end tag may be left out
+OPTIONAL_END_ELEMENTS = {
+    "body", "colgroup", "dd", "dt", "head", "html", "li", "optgroup", "option", "p", "rp", "rt",
+    "tbody", "td", "tfoot", "th", "thead", "tr",
+}
+
+_CLASS_SELECTOR_PATTERN = re.compile(r"\.(-?[_a-zA-Z][\w-]*)")
+_CSS_STRING_PATTERN = re.compile(r"\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'")
+
+
+def issue(severity, filename, description):
+    return {"severity": severity, "file": filename, "description": description}
+
+
+class _TagChecker(HTMLParser):
+    """
+    Tracks open elements to find mismatched, stray and unclosed tags, and collects the
+    class names used in the document.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+        self.problems = []
+        self.classes = set()
+
+    def handle_starttag(self, tag, attrs):
+        for name, value in attrs:
+            if name == "class" and value:
+                self.classes.update(value.split())
+        if tag not in VOID_ELEMENTS:
+            self.stack.append((tag, self.getpos()[0]))
+
+    def handle_startendtag(self, tag, attrs):
+        for name, value in attrs:
+            if name == "class" and value:
+                self.classes.update(value.split())
+
+    def handle_endtag(self, tag):
+        line = self.getpos()[0]
+        if tag in VOID_ELEMENTS:
+            return
+
+        open_tags = [open_tag for open_tag, _ in self.stack]
+        if tag not in open_tags:
+            self.problems.append(f"Line {line}: </{tag}> has no matching <{tag}>.")
+            return
+
+        # Close the element, and any elements inside it that may omit their end tag
+        while self.stack:
+            open_tag, open_line = self.stack.pop()
+            if open_tag == tag:
+                break
+            if open_tag not in OPTIONAL_END_ELEMENTS:
+                self.problems.append(f"Line {line}: </{tag}> closes <{tag}> while <{open_tag}> from line {open_line} is still open.")
+
+    def unclosed(self):
+        return [
+            f"<{tag}> opened on line {line} is never closed."
+            for tag, line in self.stack
+            if tag not in OPTIONAL_END_ELEMENTS
+        ]
+
+
+def check_html(html, filename="index.html"):
+    """
+    Returns the well-formedness problems of an HTML document and the classes it uses.
+    """
+    checker = _TagChecker()
+    checker.feed(html)
+    checker.close()
+    problems = checker.problems + checker.unclosed()
+    return [issue(ERROR, filename, problem) for problem in problems], checker.classes
+
+
+def check_css(css, filename="styles.css"):
+    """
+    Returns the parse errors of a stylesheet (unbalanced braces, unterminated comments,
+    declarations without a colon) and the classes its selectors refer to.
+    """
+    issues = []
+    classes = set()
+
+    if css.count("/*") > css.count("*/"):
+        issues.append(issue(ERROR, filename, "A /* comment is never closed."))
+    # Blank out comments and strings, keeping newlines so line numbers stay right
+    css = re.sub(r"/\*.*?(\*/|$)", lambda m: re.sub(r"[^\n]", " ", m.group(0)), css, flags=re.DOTALL)
+    css = _CSS_STRING_PATTERN.sub(lambda m: '""', css)
+
+    depth = 0
+    # Inside parentheses, as in url(data:image/svg+xml;utf8,...), a ';' doesn't end a declaration
+    parens = 0
+    segment = []
+    line = 1
+    for char in css:
+        if char == "\n":
+            line += 1
+        if char == "(":
+            parens += 1
+        elif char == ")":
+            parens = max(parens - 1, 0)
+        if char == ";" and parens:
+            segment.append(char)
+        elif char == "{":
+            selector = "".join(segment).strip()
+            if not selector.startswith("@"):
+                classes.update(_CLASS_SELECTOR_PATTERN.findall(selector))
+            depth += 1
+            parens = 0
+            segment = []
+        elif char in ";}":
+            declaration = "".join(segment).strip()
+            if depth and declaration and ":" not in declaration:
+                issues.append(issue(ERROR, filename, f"Line {line}: '{declaration}' is not a valid declaration (missing ':')."))
+            if char == "}":
+                depth -= 1
+                if depth < 0:
+                    issues.append(issue(ERROR, filename, f"Line {line}: '}}' has no matching '{{'."))
+                    depth = 0
+            parens = 0
+            segment = []
+        else:
+            segment.append(char)
+
+    if depth:
+        issues.append(issue(ERROR, filename, f"{depth} '{{' block(s) are never closed."))
+    return issues, classes
+
+
+def check_class_references(html_classes, css_classes, html_filename="index.html", css_filename="styles.css"):
+    """
+    Warns about classes that are styled but never used, or used but never styled.
+    """
+    issues = []
+    unused = sorted(css_classes - html_classes)
+    unstyled = sorted(html_classes - css_classes)
+    if unused:
+        issues.append(issue(WARNING, css_filename, f"Has rules for classes that {html_filename} never uses: {', '.join(unused[:10])}."))
+    if unstyled:
+        issues.append(issue(WARNING, html_filename, f"Uses classes that have no rule in {css_filename}: {', '.join(unstyled[:10])}."))
+    return issues
+
+
+def check_plan(plan, filename="plan.md", milestone=None):
+    """
+    Checks that the plan has milestones and that the milestone numbered `milestone`, the
+    one the implementation step worked on, is marked off. Without `milestone`, at least
+    one milestone has to be marked off.
+    """
+    milestones = parse_milestones(plan)
+    if not milestones:
+        return [issue(ERROR, filename, "The plan has no milestones.")]
+    if not any(found.done for found in milestones):
+        return [issue(ERROR, filename, "No milestone has been marked off in the plan.")]
+    for found in milestones:
+        if found.number == milestone and not found.done:
+            return [issue(ERROR, filename, f"Milestone {milestone} has not been marked off in the plan.")]
+    return []
+
+
+def run_static_checks(store, milestone=None):
+    """
+    Runs every local check over the artifacts and returns the issues found, errors first.
+    `milestone` is the number of the milestone that has to be marked off, see `check_plan`.
+    """
+    files = {filename: store.read(filename) for filename in ("plan.md", "index.html", "styles.css")}
+    issues = []
+    for filename, contents in files.items():
+        if contents is None:
+            issues.append(issue(ERROR, filename, "The file does not exist."))
+
+    if files["plan.md"] is not None:
+        issues += check_plan(files["plan.md"], milestone=milestone)
+
+    html_classes = css_classes = None
+    if files["index.html"] is not None:
+        html_issues, html_classes = check_html(files["index.html"])
+        issues += html_issues
+    if files["styles.css"] is not None:
+        css_issues, css_classes = check_css(files["styles.css"])
+        issues += css_issues
+    if html_classes is not None and css_classes is not None:
+        issues += check_class_references(html_classes, css_classes)
+
+    return sorted(issues, key=lambda found: found["severity"] != ERROR)
@@ -0,0 +1,119 @@
+import time
+import asyncio
+
+from agents.json_stream import ArgumentStream
+
+
+class StreamRelay:
+    """
+    Streams tokens to a UI message in batches.
+
+    Tokens are buffered and sent once `flush_chars` characters have piled up or
+    `flush_interval` seconds have passed since the last flush, so a fast model causes a
+    few dozen websocket messages per second rather than one per token. Flushing is awaited
+    inline, so a slow client also slows down how fast the model stream is read.
+    """
+
+    def __init__(self, message, flush_interval=0.05, flush_chars=200):
+        self.message = message
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self.flushes = 0
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+    async def write(self, token):
+        self._buffer.append(token)
+        self._buffered += len(token)
+        if self._buffered >= self.flush_chars or time.monotonic() - self._last_flush >= self.flush_interval:
+            await self.flush()
+
+    async def flush(self):
+        if self._buffer:
+            await self.message.stream_token("".join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+            self.flushes += 1
+        self._last_flush = time.monotonic()
+
+    async def close(self):
+        """
+        Sends whatever is still buffered and finalizes the message.
+        """
+        await self.flush()
+        await self.message.update()
+
+
+class ToolCallProgress:
+    """
+    Shows the progress of streamed tool calls, such as the bytes of index.html generated so
+    far, as one UI step per call. Updates are sent at most every `update_interval` seconds.
+    Only calls to the tools in `tool_names` are shown.
+
+    The arguments are parsed as they arrive. With a `store`, the contents of an
+    updateArtifact call are saved as a draft of the file every `draft_interval` seconds,
+    so the page can be looked at long before the call is complete. Drafts of calls that
+    complete are discarded once the stream ends, since the agent then commits the
+    validated file; a call cut off before its contents were complete keeps its draft.
+    """
+
+    def __init__(self, ui, tool_names, store=None, update_interval=0.25, draft_interval=0.5):
+        self.ui = ui
+        self.tool_names = set(tool_names)
+        self.store = store
+        self.update_interval = update_interval
+        self.draft_interval = draft_interval
+        self.drafts = 0
+        self._calls = {}
+
+    def _describe(self, call):
+        target = call["arguments"].value("filename") if "filename" in call["arguments"].complete else None
+        return f"{call['name']} {target or '...'}: {call['arguments'].length:,} bytes generated"
+
+    async def _write_draft(self, call):
+        arguments = call["arguments"]
+        if "filename" not in arguments.complete or "contents" not in arguments.values:
+            return
+        await asyncio.to_thread(self.store.write_draft, arguments.value("filename"), arguments.value("contents"))
+        call["draft"] = arguments.value("filename")
+        call["last_draft"] = time.monotonic()
+        self.drafts += 1
+
+    async def update(self, index, name, arguments):
+        """
+        Records the name and argument fragments of a tool call delta. `name` and
+        `arguments` are the lists the fragments are collected in.
+        """
+        call = self._calls.get(index)
+        if call is None:
+            name = "".join(name)
+            if name not in self.tool_names:
+                return
+            call = self._calls[index] = {"name": name, "arguments": ArgumentStream(), "draft": None, "last_update": 0.0, "last_draft": 0.0, "step": None}
+            call["step"] = self.ui.new_step(name, type="tool")
+            await call["step"].send()
+
+        call["arguments"].feed(arguments[-1])
+
+        now = time.monotonic()
+        if self.store is not None and call["name"] == "updateArtifact" and not call["arguments"].closed and now - call["last_draft"] >= self.draft_interval:
+            await self._write_draft(call)
+        if now - call["last_update"] >= self.update_interval:
+            call["last_update"] = now
+            call["step"].output = self._describe(call)
+            await call["step"].update()
+
+    async def close(self):
+        for call in self._calls.values():
+            # Contents that arrived complete are committed by the agent even if the call was cut off later
+            if call["arguments"].closed or "contents" in call["arguments"].complete:
+                if call["draft"]:
+                    await asyncio.to_thread(self.store.discard_draft, call["draft"])
+                call["step"].output = self._describe(call).replace("generated", "received")
+            else:
+                if self.store is not None and call["name"] == "updateArtifact":
+                    await self._write_draft(call)
+                call["step"].output = self._describe(call).replace("generated", "received, cut off")
+            await call["step"].update()
+        self._calls = {}
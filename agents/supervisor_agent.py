@@ -1,14 +1,57 @@
-import os
 import json
+import asyncio
+import logging
 
 from agents.base_agent import Agent
+from agents.scheduler import PRIORITY_INTERACTIVE
+from agents.budget import BudgetExceeded, RunBudget, budget_trips, current_budget, use_budget
 from agents.planning_agent import PlanningAgent
 from agents.implementation_agent import ImplementationAgent
 from agents.reviewer_agent import ReviewerAgent
+from agents.context_window import ContextWindow
+from agents.context_builder import MilestoneContext
+from agents.registry import AgentRegistry
+from agents.tracing import tracer
+from agents.orchestrator import DONE
+from agents.review import STATIC_CHECKS_FAILED
+from agents.response_cache import response_cache_stats
+from agents.checkpoint import FINISHED, RUNNING, get_current_checkpoint
+from agents.candidates import CandidateSelector, candidate_implementer_from_env
+
+logger = logging.getLogger(__name__)
+
+SUPERVISOR_PROMPT = """\
+You are a software engineeing mananger, leading your team to build a web page in the image that the user sends. 
+Once they send an image, you need to work with a software architect to generate a plan.
+After the plan is created, work with a software engineer to implement each milestone.
+You also need to work with a reviewer alongside to review the implementation of a milestone. You should ask the software engineer to reimplement a milestone if changes are requested by the reviewer. 
+Each milestone must be reviewed after the implementation before moving on to implementing the next one. Your role is to coordinate the activities for building the project.
+You will not write or implement the plan, and will not write any code in the plan or the html or css files. You will also not review the implementation by yourself.
+
+These are your goals:
+
+- Work with the software architect to create and save the plan
+- Work with a software engineer to implement all the milestones, ONE milestone at a time, in the generated plan
+- Work with a reviewer to review each milestone's implementation, address and update any feedback before moving to implementing the next one.
+
+You have available tool to call the right person for completing a task.
+
+Use the following format to complete the project:
+Thought: You should always think about what the user is asking for
+Action: contacting someone to help with the task, only use callAgent to do that
+ActionInput: only one of 'planning', 'implementation' or 'reviewer' to call the right person for the task. After each implementation, make sure to call reviewer to get feedback on the implementation.
+Observation: The result of the action once all necessary information is gathered. Start from milestone 1, if the software engineer completes one milestone, ask the reviewer to review the implementation of the milestone and get feedback.
+If the reviewer provides feedback to improve or update the implementation, ask the engineer to reimplement the current milestone and then get it reviewed again. Once the implementation of a milestone looks good, 
+move to the implementation and review of the next milestone. Repeat this until the last milestone has been implemented
+Thought: I now have a milestone implemented and reviewed. If the review looks good, move to the next milestone.
+Final Answer: Complete the checklist:
+The plan has been generated and saved
+- The implementation has been completed and saved, each milestone has been reviewed and also marked off in the plan.
+
+Once the project has been built, do not call the planning, implementation or review again until the user provides further input. Do not
+use the tool again once all the milestones have been implemented, reviewed and approved by the reviewer.
+"""
 
-import chainlit as cl
-
-from langfuse.openai import AsyncOpenAI
 
 PLANNING_PROMPT = """\
 You are a software architect, preparing to build the web page in the image that the user sends. 
@@ -55,6 +98,9 @@ After creating the implementation, do the following:
     1. use available tools to save or update both index.html and styles.css in the artifact folder. A tool is available to update the artifacts. 
     2. use the available tools to mark off the milestone in the provided plan in the artifact folder. A tool is available to update the artifacts.
 
+To change part of a file that already exists, such as marking off a milestone in the plan or adjusting a few CSS rules, use the patchArtifact tool with \
+search/replace edits instead of rewriting the whole file. If a patch can't be applied, save the complete file with updateArtifact.
+
 You should also take feedback to fix a milestone. If the implementation has already been saved, no need to save it again unless there is feedback. Do not \
 use the tool again if there are no changes.
 """
@@ -67,16 +113,43 @@ You wil read the provided plan and check if the index.html and styles.css have t
 implementation looks good or the implementation of the milestone needs to be improved and implemented again. Also check if the provided plan was marked off for the completed milestone.
 
 Your role is only to review the implementation of only ONE (and that too the latest) completed milestone. You will not write or implement the plan, and will not write any code in the plan.
+
+Submit your review with the submitReview tool: the verdict is "approved" if the milestone is implemented correctly and marked off, otherwise "changes_requested" \
+with each problem listed as an issue, naming the file and what is expected instead.
+"""
+
+SELECTION_PROMPT = """\
+You are a reviewer choosing between several implementations of the same milestone, each made by a different software engineer.
+
+The artifacts as they were before the milestone are provided to you at the end of this prompt, and each candidate is shown as a diff against them. \
+Pick the candidate that implements the current milestone of the plan most completely and correctly, with clean HTML and CSS that fits the \
+existing page, and that marks the milestone off in the plan.
+
+Submit your choice with the pickCandidate tool.
 """
 
-client = AsyncOpenAI()
+def build_implementation_agent():
+    # The implementer only sees the milestone it works on
+    agent = ImplementationAgent(name="Implementation Agent", prompt=IMPLEMENTATION_PROMPT, context_window=ContextWindow(max_tokens=32000), context_builder=MilestoneContext(focus="next"))
+    # With IMPLEMENTATION_CANDIDATES above one, each milestone is implemented several times in parallel
+    return candidate_implementer_from_env(agent, CandidateSelector(name="Candidate Selector", prompt=SELECTION_PROMPT, context_window=ContextWindow(max_tokens=32000), context_builder=MilestoneContext(focus="next", include_overview=False)))
 
-# Create an instance of the Agent class
-planning_agent = PlanningAgent(name="Planning Agent", client=client, prompt=PLANNING_PROMPT)
-implementation_agent = ImplementationAgent(name="Implementation Agent", client=client, prompt=IMPLEMENTATION_PROMPT)
-reviewer_agent = ReviewerAgent(name="Reviewer Agent", client=client, prompt=REVIEW_PROMPT)
+
+# Agents are built the first time the supervisor calls them, and the shared client on
+# their first LLM call, so importing this module stays cheap
+registry = AgentRegistry({
+    "planning": lambda: PlanningAgent(name="Planning Agent", prompt=PLANNING_PROMPT, context_window=ContextWindow(max_tokens=24000)),
+    "implementation": build_implementation_agent,
+    # The reviewer only sees the milestone it reviews
+    "reviewer": lambda: ReviewerAgent(name="Reviewer Agent", prompt=REVIEW_PROMPT, context_window=ContextWindow(max_tokens=24000), context_builder=MilestoneContext(focus="latest", include_overview=False)),
+})
 
 class SupervisorAgent(Agent):
+    route = "supervisor"
+    priority = PRIORITY_INTERACTIVE
+
+    # Only routes between agents, so it never needs the screenshot itself
+    vision = False
 
     tools = [
         {
@@ -99,18 +172,154 @@ class SupervisorAgent(Agent):
         }
     ]
 
-    def __init__(self, name, client, prompt="", gen_kwargs=None):
+    def __init__(self, name, client=None, prompt="", gen_kwargs=None, artifact_store=None, context_window=None, tool_executor=None, max_iterations=None, context_builder=None, agents=None, orchestrator=None):
+
+        super().__init__(name, client, prompt=prompt, gen_kwargs=gen_kwargs, artifact_store=artifact_store, context_window=context_window, tool_executor=tool_executor, max_iterations=max_iterations, context_builder=context_builder)
+        # Sub-agents reachable through callAgent, keyed by the name the model uses
+        self.agents = agents or registry
+        # Optional rule-based router that makes the unambiguous decisions without an LLM call
+        self.orchestrator = orchestrator
+
+    @property
+    def checkpoint(self):
+        """
+        The SessionCheckpoint of the current session, if checkpointing is enabled.
+        """
+        return get_current_checkpoint()
 
-        super().__init__(name, client, prompt=prompt, gen_kwargs=gen_kwargs)    
+    async def _save_checkpoint(self, message_history, calls, status=RUNNING):
+        if self.checkpoint:
+            with tracer.span("checkpoint", agent=self.name, status=status):
+                await self.checkpoint.save(message_history, calls, self.artifact_store, status=status)
 
-    async def execute(self, message_history):
+    async def resume(self):
+        """
+        Restores the current session from its latest checkpoint and, if the build was
+        interrupted, continues it from the last completed agent step. Returns the restored
+        message history, or None if there is no checkpoint.
+        """
+        if not self.checkpoint:
+            return None
+        state = await self.checkpoint.restore(self.artifact_store)
+        if state is None:
+            return None
+
+        message_history = state["message_history"]
+        self.ui.save_history(message_history)
+        if state["status"] == RUNNING:
+            logger.info("%s: Resuming build at checkpoint step %s", self.__class__.__name__, state["step"])
+            await self.execute(message_history, calls=[tuple(call) for call in state["calls"]])
+        return message_history
+
+    async def _call_agent(self, index_data, message_history):
+        """
+        Runs the requested sub-agent on a copy of the history and returns the messages it
+        added together with its response.
+        """
+        if "callAgent" != index_data["name"]:
+            return [], None
+
+        arguments_dict = json.loads(index_data["arguments"])
+        agent_name = arguments_dict.get("agent_name")
+        logger.debug("%s: Calling %s agent from supervisor agent", self.__class__.__name__, agent_name)
+        agent = self.agents.get(agent_name)
+        if agent is None:
+            return [], None
+
+        branch = message_history.copy()
+        store = self.artifact_store
+        before = store.stats() if tracer.enabled else None
+        # Everything the sub-agent streams shows up nested in its own step
+        async with self.ui.new_step(agent.name):
+            with tracer.span("execute", agent=agent.name) as span:
+                response_message = await agent.execute(branch)
+                if before:
+                    after = store.stats()
+                    span.set(
+                        artifact_bytes_read=after["bytes_read"] - before["bytes_read"],
+                        artifact_bytes_written=after["bytes_written"] - before["bytes_written"],
+                    )
+        return branch[len(message_history):], response_message
+
+    async def _roll_back_rejected(self, review, version):
+        """
+        Undoes the implementation step started at artifact `version` when the static checks
+        rejected its result, so the rework starts from the files as they were before it
+        rather than from broken ones. Returns the review, noting the rollback if there was one.
+        """
+        if version is None or STATIC_CHECKS_FAILED not in review:
+            return review
+        if not await asyncio.to_thread(self.artifact_store.rollback, version):
+            return review
+        logger.info("%s: Rolled the artifacts back to version %s after the static checks failed", self.__class__.__name__, version)
+        return f"{review}\nThe changes from the rejected implementation step were rolled back, so the milestone has to be implemented again."
+
+    async def _route(self, message_history, calls):
+        """
+        Decides what to do next. Returns the response text and the tool calls to run,
+        either decided by the orchestrator or by the supervisor LLM.
+        """
+        decision = self.orchestrator.decide(self.artifact_store, calls) if self.orchestrator else None
+        if decision is None:
+            response_message, function_data = await self.handle_tool_calls(message_history)
+            return response_message.content, function_data
+
+        logger.debug("%s: Orchestrator decided %s", self.__class__.__name__, decision)
+        if decision == DONE:
+            content = "All milestones have been implemented and reviewed."
+            message = self.ui.new_message()
+            await message.stream_token(content)
+            await message.update()
+            return content, {}
+
+        return None, {0: {"name": "callAgent", "arguments": json.dumps({"agent_name": decision})}}
+
+    async def execute(self, message_history, calls=None):
         """
         Executes the agent's main functionality.
 
+        `calls` holds the (agent name, response) pairs of a resumed run.
+
         Note: probably shouldn't couple this with chainlit, but this is just a prototype.
         """
-
-        print(f"{self.__class__.__name__}: Inside the execution and processing the request")  
+        # The supervisor and every sub-agent it calls share one run budget
+        token = use_budget(RunBudget.from_env()) if self.budget is None else None
+        budget = self.budget
+        calls = list(calls or [])
+        try:
+            with tracer.span("execute", agent=self.name):
+                result = await self._execute(message_history, calls)
+            await self._save_checkpoint(message_history, calls, status=FINISHED)
+            return result
+        finally:
+            self._log_run(budget)
+            if token:
+                current_budget.reset(token)
+
+    def _log_run(self, budget):
+        """
+        Logs what the run used, including the prompt tokens the provider served from its
+        cache, and which budgets stopped it, with the process-wide count of budget trips.
+        With a response cache, also logs how many calls it answered in this run and its
+        hit rate across the process.
+        """
+        trips = ", ".join(f"{kind} x{count}" for kind, count in budget.trips.items()) or "none"
+        totals = ", ".join(f"{kind} x{count}" for kind, count in budget_trips.items()) or "none"
+        logger.info(
+            "%s: Run finished in %.1fs using %s tokens, %s of %s prompt tokens cached; budget trips: %s (process: %s)",
+            self.__class__.__name__, budget.elapsed(), budget.tokens, budget.cached_tokens, budget.prompt_tokens, trips, totals,
+        )
+        cache = response_cache_stats()
+        if cache:
+            logger.info(
+                "%s: Response cache answered %s of %s calls (process: %s hits, %s misses, %.0f%% hit rate)",
+                self.__class__.__name__, budget.response_cache_hits, budget.response_cache_hits + budget.response_cache_misses,
+                cache["hits"], cache["misses"], 100 * cache["hit_rate"],
+            )
+
+    async def _execute(self, message_history, calls):
+
+        logger.debug("%s: Inside the execution and processing the request", self.__class__.__name__)
         copied_message_history = message_history.copy()
 
         # Check if the first message is a system prompt
@@ -121,44 +330,54 @@ class SupervisorAgent(Agent):
             # Insert the agent's prompt at the beginning
             copied_message_history.insert(0, {"role": "system", "content": self._build_system_prompt()})
         
-        response_message, function_data = await self.handle_tool_calls(copied_message_history)
+        # `calls` holds (agent name, response) of every sub-agent called in this run, for
+        # the orchestrator and the checkpoints
+        content, function_data = await self._route(copied_message_history, calls)
         #print(f"{self.__class__.__name__}: Function data: ", function_data)
-        #print(f"{self.__class__.__name__}: Response text: ", response_message.content)
+        #print(f"{self.__class__.__name__}: Response text: ", content)
                 
-        if response_message.content:
-            message_history.append({"role": "assistant", "content": response_message.content})
-            copied_message_history.append({"role": "assistant", "content": response_message.content})
-            cl.user_session.set("message_history", message_history)
+        if content:
+            message_history.append({"role": "assistant", "content": content})
+            copied_message_history.append({"role": "assistant", "content": content})
+            self.ui.save_history(message_history)
 
         #print(f"DEBUG: function_data: {function_data}")
-        while function_data:
-            print(f"{self.__class__.__name__}: Received Function data just inside while loop: ", function_data)
-            for index, index_data in function_data.items():
-                if "callAgent" == index_data["name"]:
-                    arguments_dict = json.loads(index_data["arguments"])
-                    agent_name = arguments_dict.get("agent_name")
-                    print(f"{self.__class__.__name__}: Calling {agent_name} agent from supervisor agent")
-                    if agent_name == 'planning':
-                        response_message = await planning_agent.execute(message_history)
-                        message_history.append({"role": "system", "content": response_message})
-                        copied_message_history.append({"role": "system", "content": response_message})
-                    elif agent_name == "implementation":
-                        response_message = await implementation_agent.execute(message_history)
+        iteration = 0
+        # Artifact version before the latest implementation step, to roll back to if rejected
+        implemented_from = None
+        try:
+            while function_data:
+                iteration += 1
+                self._check_loop(iteration, function_data)
+                logger.debug("%s: Received Function data just inside while loop: %s", self.__class__.__name__, function_data)
+                # Sub-agents share the workspace and build on each other's work, e.g. the
+                # reviewer reads what the implementer wrote, so calls from the same turn run
+                # one after another in tool call order
+                for index in sorted(function_data):
+                    agent_name = json.loads(function_data[index]["arguments"]).get("agent_name") if function_data[index]["name"] == "callAgent" else None
+                    if agent_name == "implementation":
+                        implemented_from = self.artifact_store.version
+                    new_messages, response_message = await self._call_agent(function_data[index], message_history)
+                    message_history.extend(new_messages)
+                    if response_message is not None:
+                        if agent_name == "reviewer":
+                            response_message = await self._roll_back_rejected(response_message, implemented_from)
+                            implemented_from = None
                         message_history.append({"role": "system", "content": response_message})
                         copied_message_history.append({"role": "system", "content": response_message})
-                    elif agent_name == "reviewer":
-                        response_message = await reviewer_agent.execute(message_history)
-                        message_history.append({"role": "system", "content": response_message})
-                        copied_message_history.append({"role": "system", "content": response_message})
-
-                        
-            response_message, function_data = await self.handle_tool_calls(copied_message_history)
-            print(f"{self.__class__.__name__}: Function data in loop: ", function_data)
-            print(f"{self.__class__.__name__}: Response text in loop: ", response_message.content)
-            if response_message.content:
-                message_history.append({"role": "assistant", "content": response_message.content})
-                copied_message_history.append({"role": "assistant", "content": response_message.content})
-                cl.user_session.set("message_history", message_history)
-        else:
-            print("No tool call")
+                        calls.append((agent_name, response_message))
+                    self.ui.save_history(message_history)
+                    await self._save_checkpoint(message_history, calls)
+
+                content, function_data = await self._route(copied_message_history, calls)
+                logger.debug("%s: Function data in loop: %s", self.__class__.__name__, function_data)
+                logger.debug("%s: Response text in loop: %s", self.__class__.__name__, content)
+                if content:
+                    message_history.append({"role": "assistant", "content": content})
+                    copied_message_history.append({"role": "assistant", "content": content})
+                    self.ui.save_history(message_history)
+            else:
+                logger.debug("No tool call")
+        except BudgetExceeded as e:
+            await self._stop(e, message_history)
         
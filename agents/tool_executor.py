@@ -0,0 +1,34 @@
+import asyncio
+
+
+class ToolExecutor:
+    """
+    Runs the tool calls of one model turn concurrently.
+
+    At most `max_concurrency` calls run at once. Results come back in tool call index
+    order regardless of which call finished first, so the messages built from them are
+    deterministic. If a call fails, the others still run to completion before the first
+    error is re-raised.
+    """
+
+    def __init__(self, max_concurrency=4):
+        self.max_concurrency = max_concurrency
+
+    async def run(self, function_data, handler):
+        """
+        Calls `await handler(index_data)` for every entry of `function_data` and returns
+        the results as a list ordered by tool call index.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def guarded(index_data):
+            async with semaphore:
+                return await handler(index_data)
+
+        ordered = [function_data[index] for index in sorted(function_data)]
+        results = await asyncio.gather(*(guarded(index_data) for index_data in ordered), return_exceptions=True)
+
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
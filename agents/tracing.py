@@ -0,0 +1,183 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """
+    One timed operation: an LLM call, an agent execution or a tool call.
+    """
+
+    __slots__ = ("name", "attributes", "start", "start_wall", "duration")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.start_wall = time.time()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def to_dict(self):
+        return {"name": self.name, "start": self.start_wall, "duration": self.duration, **self.attributes}
+
+
+class _NullSpan:
+    """
+    Returned when tracing is disabled so instrumented code needs no checks.
+    """
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def elapsed(self):
+        return 0.0
+
+
+NULL_SPAN = _NullSpan()
+
+
+class RingBufferSink:
+    """
+    Keeps the most recent spans in memory.
+    """
+
+    def __init__(self, maxlen=1000):
+        self.spans = deque(maxlen=maxlen)
+
+    def emit(self, span):
+        self.spans.append(span.to_dict())
+
+
+class JsonlSink:
+    """
+    Appends spans to a JSON Lines file, flushing every `flush_every` spans.
+    """
+
+    def __init__(self, path, flush_every=20):
+        self.path = path
+        self.flush_every = flush_every
+        self._pending = []
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def emit(self, span):
+        with self._lock:
+            self._pending.append(json.dumps(span.to_dict(), default=str))
+            if len(self._pending) >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        if self._pending:
+            with open(self.path, "a") as f:
+                f.write("\n".join(self._pending) + "\n")
+            self._pending = []
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+
+def langfuse_enabled():
+    """
+    Whether Langfuse is configured. Its SDK is only imported when it is.
+    """
+    return bool(os.getenv("LANGFUSE_PUBLIC_KEY") and os.getenv("LANGFUSE_SECRET_KEY"))
+
+
+def observe(func):
+    """
+    Langfuse's @observe decorator when Langfuse is configured, otherwise a no-op.
+    """
+    if not langfuse_enabled():
+        return func
+    from langfuse.decorators import observe as langfuse_observe
+
+    return langfuse_observe(func)
+
+
+class LangfuseSink:
+    """
+    Records spans as Langfuse spans, nested under the trace of the enclosing @observe call.
+    """
+
+    def __init__(self):
+        from langfuse.decorators import langfuse_context
+
+        self.langfuse_context = langfuse_context
+
+    def emit(self, span):
+        try:
+            self.langfuse_context.client_instance.span(
+                trace_id=self.langfuse_context.get_current_trace_id(),
+                parent_observation_id=self.langfuse_context.get_current_observation_id(),
+                name=span.name,
+                start_time=datetime.fromtimestamp(span.start_wall, tz=timezone.utc),
+                end_time=datetime.fromtimestamp(span.start_wall + span.duration, tz=timezone.utc),
+                metadata=span.attributes,
+            )
+        except Exception as e:
+            logger.debug("Could not send span to Langfuse: %s", e)
+
+
+class Tracer:
+    """
+    Records spans to the configured sinks. Without sinks, `span` yields a shared no-op
+    span and costs a single attribute check.
+    """
+
+    sink_types = {
+        "memory": lambda: RingBufferSink(),
+        "jsonl": lambda: JsonlSink(os.getenv("TRACE_JSONL_PATH", "traces.jsonl")),
+        "langfuse": lambda: LangfuseSink(),
+    }
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a tracer from TRACE_SINKS, a comma separated list of memory, jsonl and langfuse.
+        """
+        names = [name.strip() for name in os.getenv("TRACE_SINKS", "").split(",") if name.strip()]
+        return cls([cls.sink_types[name]() for name in names])
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        if not self.sinks:
+            yield NULL_SPAN
+            return
+
+        span = Span(name, attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=repr(e))
+            raise
+        finally:
+            span.duration = span.elapsed()
+            for sink in self.sinks:
+                sink.emit(span)
+
+
+tracer = Tracer.from_env()
@@ -0,0 +1,113 @@
+from contextvars import ContextVar
+
+
+class ChainlitUI:
+    """
+    Sends agent output to the Chainlit session the current task belongs to. Chainlit is
+    imported on first use, so headless runs never load it.
+    """
+
+    def new_message(self):
+        import chainlit as cl
+
+        return cl.Message(content="")
+
+    def new_step(self, name, type="run"):
+        """
+        Returns a step nested in the step the current task is running in, if any. Use it
+        with `async with`, or call send() and update() on it.
+        """
+        import chainlit as cl
+        from chainlit.context import local_steps
+
+        steps = local_steps.get() or []
+        return cl.Step(name=name, type=type, parent_id=steps[-1].id if steps else None)
+
+    def save_history(self, message_history):
+        import chainlit as cl
+
+        cl.user_session.set("message_history", message_history)
+
+
+class HeadlessMessage:
+    """
+    Stand-in for cl.Message that only accumulates the streamed text.
+    """
+
+    def __init__(self):
+        self.content = ""
+
+    async def stream_token(self, token):
+        self.content += token
+
+    async def send(self):
+        return self
+
+    async def update(self):
+        return self
+
+
+class HeadlessStep(HeadlessMessage):
+    """
+    Stand-in for cl.Step.
+    """
+
+    def __init__(self, name, type):
+        super().__init__()
+        self.name = name
+        self.type = type
+        self.output = ""
+        self.updates = 0
+
+    async def stream_token(self, token):
+        self.output += token
+
+    async def update(self):
+        self.updates += 1
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.update()
+
+
+class HeadlessUI:
+    """
+    Collects agent output in memory so builds can run without a Chainlit session.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.steps = []
+        self.message_history = None
+
+    def new_message(self):
+        message = HeadlessMessage()
+        self.messages.append(message)
+        return message
+
+    def new_step(self, name, type="run"):
+        step = HeadlessStep(name, type)
+        self.steps.append(step)
+        return step
+
+    def save_history(self, message_history):
+        self.message_history = message_history
+
+
+chainlit_ui = ChainlitUI()
+
+current_ui = ContextVar("current_ui", default=None)
+
+
+def get_ui():
+    """
+    Returns the UI of the current task, Chainlit unless a headless UI was bound.
+    """
+    return current_ui.get() or chainlit_ui
+
+
+def use_ui(ui):
+    return current_ui.set(ui)
@@ -0,0 +1,58 @@
+import os
+from contextvars import ContextVar
+
+from agents.artifact_store import ArtifactStore, InMemoryArtifactStore, default_store
+
+# The artifact store of the build running in the current task. Chainlit runs every
+# message handler in its own task, so concurrent sessions never see each other's store.
+current_store = ContextVar("current_store", default=None)
+
+
+def get_current_store():
+    """
+    Returns the artifact store for the current session, or the shared default store.
+    """
+    return current_store.get() or default_store
+
+
+def use_workspace(store):
+    """
+    Makes the given store the workspace for the current task and everything it awaits.
+    """
+    return current_store.set(store)
+
+
+class WorkspaceManager:
+    """
+    Creates and tracks one isolated artifact workspace per session.
+
+    Backends:
+        local  -- a directory per session under `root`
+        memory -- an in-process dict, nothing is written to disk
+    """
+
+    backends = {
+        "local": lambda root, session_id: ArtifactStore(os.path.join(root, session_id)),
+        "memory": lambda root, session_id: InMemoryArtifactStore(),
+    }
+
+    def __init__(self, backend="local", root="artifacts"):
+        if backend not in self.backends:
+            raise ValueError(f"Unknown workspace backend '{backend}', expected one of {sorted(self.backends)}")
+        self.backend = backend
+        self.root = root
+        self.workspaces = {}
+
+    def get(self, session_id):
+        """
+        Returns the workspace for a session, creating it on first use.
+        """
+        if session_id not in self.workspaces:
+            self.workspaces[session_id] = self.backends[self.backend](self.root, session_id)
+        return self.workspaces[session_id]
+
+    def release(self, session_id):
+        """
+        Forgets a session's workspace. Files written by the local backend stay on disk.
+        """
+        return self.workspaces.pop(session_id, None)
@@ -1,67 +1,47 @@
 from dotenv import load_dotenv
-import chainlit as cl
-from agents.supervisor_agent import SupervisorAgent
-import base64
-
 
+# Load the environment before the agents package reads its settings at import time
 load_dotenv()
 
+import chainlit as cl
+from agents.supervisor_agent import SUPERVISOR_PROMPT, SupervisorAgent
+from agents.workspace import WorkspaceManager, use_workspace
+from agents.context_window import ContextWindow
+from agents.context_builder import MilestoneContext
+from agents.images import image_cache
+from agents.clients import model_router
+from agents.orchestrator import orchestrator_from_env
+from agents.checkpoint import SessionCheckpoint, checkpoint_store_from_env, use_checkpoint
+from agents.scheduler import use_session_id
+from agents.tracing import observe
+import asyncio
+import os
+
+
 # Note: If switching to LangSmith, uncomment the following, and replace @observe with @traceable
 # from langsmith.wrappers import wrap_openai
 # from langsmith import traceable
 # client = wrap_openai(openai.AsyncClient())
 
-from langfuse.decorators import observe
-from langfuse.openai import AsyncOpenAI
- 
-
 SYSTEM_PROMPT = """\
 You are a pirate.
 """
 
-SUPERVISOR_PROMPT = """\
-You are a software engineeing mananger, leading your team to build a web page in the image that the user sends. 
-Once they send an image, you need to work with a software architect to generate a plan.
-After the plan is created, work with a software engineer to implement each milestone.
-You also need to work with a reviewer alongside to review the implementation of a milestone. You should ask the software engineer to reimplement a milestone if changes are requested by the reviewer. 
-Each milestone must be reviewed after the implementation before moving on to implementing the next one. Your role is to coordinate the activities for building the project.
-You will not write or implement the plan, and will not write any code in the plan or the html or css files. You will also not review the implementation by yourself.
-
-These are your goals:
-
-- Work with the software architect to create and save the plan
-- Work with a software engineer to implement all the milestones, ONE milestone at a time, in the generated plan
-- Work with a reviewer to review each milestone's implementation, address and update any feedback before moving to implementing the next one.
-
-You have available tool to call the right person for completing a task.
-
-Use the following format to complete the project:
-Thought: You should always think about what the user is asking for
-Action: contacting someone to help with the task, only use callAgent to do that
-ActionInput: only one of 'planning', 'implementation' or 'reviewer' to call the right person for the task. After each implementation, make sure to call reviewer to get feedback on the implementation.
-Observation: The result of the action once all necessary information is gathered. Start from milestone 1, if the software engineer completes one milestone, ask the reviewer to review the implementation of the milestone and get feedback.
-If the reviewer provides feedback to improve or update the implementation, ask the engineer to reimplement the current milestone and then get it reviewed again. Once the implementation of a milestone looks good, 
-move to the implementation and review of the next milestone. Repeat this until the last milestone has been implemented
-Thought: I now have a milestone implemented and reviewed. If the review looks good, move to the next milestone.
-Final Answer: Complete the checklist:
-The plan has been generated and saved
-- The implementation has been completed and saved, each milestone has been reviewed and also marked off in the plan.
-
-Once the project has been built, do not call the planning, implementation or review again until the user provides further input. Do not
-use the tool again once all the milestones have been implemented, reviewed and approved by the reviewer.
-"""
 
+# Create an instance of the Agent class
+# The supervisor only routes, so it sees the milestone progress rather than the code.
+# Its client is built on the first LLM call.
+supervisor_agent = SupervisorAgent(name="Supervisor Agent", prompt=SUPERVISOR_PROMPT, context_window=ContextWindow(max_tokens=16000), context_builder=MilestoneContext(include_overview=False, files=("plan.md",)), max_iterations=60, orchestrator=orchestrator_from_env())
 
-client = AsyncOpenAI()
+# One isolated artifact workspace per chat session ("local" or "memory")
+workspaces = WorkspaceManager(backend=os.getenv("ARTIFACT_BACKEND", "local"))
 
-# Create an instance of the Agent class
-supervisor_agent = SupervisorAgent(name="Supervisor Agent", client=client, prompt=SUPERVISOR_PROMPT)
+# Builds are checkpointed per chat thread so they can resume after a worker restart.
+# Only when CHECKPOINT_DB is set, since resuming needs a Chainlit data layer.
+checkpoints = checkpoint_store_from_env()
 
 
-gen_kwargs = {
-    "model": "gpt-4o-mini",
-    "temperature": 0.2
-}
+gen_kwargs = model_router.gen_kwargs("default")
 
 
 
@@ -70,13 +50,36 @@ gen_kwargs = {
 def on_chat_start():
     message_history = [{"role": "system", "content": SYSTEM_PROMPT}]
     cl.user_session.set("message_history", message_history)
+    cl.user_session.set("artifact_store", workspaces.get(cl.user_session.get("id")))
+
+@cl.on_chat_end
+def on_chat_end():
+    workspaces.release(cl.user_session.get("id"))
+    image_cache.release(cl.context.session.thread_id)
+
+def use_session(thread_id):
+    """
+    Binds the session's workspace, checkpoint and scheduling identity to the current task.
+    """
+    use_session_id(thread_id)
+    use_workspace(cl.user_session.get("artifact_store") or workspaces.get(cl.user_session.get("id")))
+    if checkpoints:
+        use_checkpoint(SessionCheckpoint(checkpoints, thread_id))
+
+@cl.on_chat_resume
+async def on_chat_resume(thread):
+    cl.user_session.set("artifact_store", workspaces.get(cl.user_session.get("id")))
+    use_session(thread["id"])
+    # Restores the artifacts and history, and finishes a build that was interrupted
+    message_history = await supervisor_agent.resume()
+    cl.user_session.set("message_history", message_history or [{"role": "system", "content": SYSTEM_PROMPT}])
 
 @observe
 async def generate_response(client, message_history, gen_kwargs):
     response_message = cl.Message(content="")
     await response_message.send()
 
-    stream = await client.chat.completions.create(messages=message_history, stream=True, **gen_kwargs)
+    stream = await client.chat.completions.create(messages=image_cache.resolve(message_history), stream=True, **gen_kwargs)
     async for part in stream:
         if token := part.choices[0].delta.content or "":
             await response_message.stream_token(token)
@@ -89,14 +92,15 @@ async def generate_response(client, message_history, gen_kwargs):
 @observe
 async def on_message(message: cl.Message):
     message_history = cl.user_session.get("message_history", [])
+    use_session(cl.context.session.thread_id)
     
     # Processing images exclusively
     images = [file for file in message.elements if "image" in file.mime] if message.elements else []
 
     if images:
-        # Read the first image and encode it to base64
-        with open(images[0].path, "rb") as f:
-            base64_image = base64.b64encode(f.read()).decode('utf-8')
+        # Encode the first image once, off the event loop; the history only keeps a
+        # reference to it, pinned in the cache for as long as the chat lasts
+        image_part = await asyncio.to_thread(image_cache.add_file, images[0].path, mime=images[0].mime, owner=cl.context.session.thread_id)
         message_history.append({
             "role": "user",
             "content": [
@@ -104,12 +108,7 @@ async def on_message(message: cl.Message):
                     "type": "text",
                     "text": message.content
                 },
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/jpeg;base64,{base64_image}"
-                    }
-                }
+                image_part
             ]
         })
     else:
@@ -0,0 +1,161 @@
+"""
+Headless batch builds: one planning -> implementation -> review build per screenshot.
+
+Every image in the input directory is built into its own workspace under --output,
+with at most --concurrency builds running at once. The LLM calls of all builds also go
+through the process-wide scheduler (LLM_REQUESTS_PER_MINUTE and friends). A summary of
+per-image latency, tokens and success is printed, and written as JSON with --report.
+
+    python batch.py screenshots/ --output builds/ --concurrency 4 --report builds/report.json
+"""
+from dotenv import load_dotenv
+
+# Load the environment before the agents package reads its settings at import time
+load_dotenv()
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from agents.artifact_store import ArtifactStore
+from agents.base_agent import prompt_cache_stats
+from agents.budget import budget_trips
+from agents.context_builder import MilestoneContext
+from agents.context_window import ContextWindow
+from agents.headless import run_headless
+from agents.images import image_cache
+from agents.orchestrator import Orchestrator
+from agents.response_cache import response_cache_stats
+from agents.supervisor_agent import SUPERVISOR_PROMPT, SupervisorAgent
+
+IMAGE_EXTENSIONS = {".gif", ".jpeg", ".jpg", ".png", ".webp"}
+
+DEFAULT_PROMPT = "Please build the web page in this screenshot. The plan doesn't need my confirmation."
+
+
+def find_images(directory):
+    """
+    Returns (name, path) for every image in `directory`. The name is the file name without
+    its extension, unless two images share it.
+    """
+    paths = sorted(
+        os.path.join(directory, filename)
+        for filename in os.listdir(directory)
+        if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+    )
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    return [
+        (stem if stems.count(stem) == 1 else os.path.basename(path), path)
+        for stem, path in zip(stems, paths)
+    ]
+
+
+async def build_image(supervisor, name, path, output, prompt, semaphore):
+    async with semaphore:
+        # The image is added once the build starts and pinned until it ends, so the image
+        # cache only holds the running builds. Every agent puts its own system prompt first.
+        image_part = await asyncio.to_thread(image_cache.add_file, path, owner=name)
+        message_history = [
+            {"role": "user", "content": [{"type": "text", "text": prompt}, image_part]},
+        ]
+        try:
+            report = await run_headless(supervisor, message_history, ArtifactStore(os.path.join(output, name)), session_id=name)
+        finally:
+            image_cache.release(name)
+        report["image"] = path
+        status = "ok" if report["success"] else "FAILED"
+        print(f"{name}: {status} in {report['latency']:.1f}s, {report['milestones_done']}/{report['milestones']} milestones, {report['tokens']} tokens", file=sys.stderr)
+        return report
+
+
+async def run_batch(supervisor, images, output, concurrency=4, prompt=DEFAULT_PROMPT):
+    """
+    Builds every (name, path) in `images` and returns the summary report.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.monotonic()
+    reports = await asyncio.gather(*(build_image(supervisor, name, path, output, prompt, semaphore) for name, path in images))
+    wall_time = time.monotonic() - started
+
+    for report in reports:
+        # Kept out of the summary; each build's files are in its workspace
+        del report["message_history"]
+    return {
+        "images": len(reports),
+        "succeeded": sum(report["success"] for report in reports),
+        "concurrency": concurrency,
+        "wall_time": wall_time,
+        # What the same builds would have taken one after another
+        "serial_time": sum(report["latency"] for report in reports),
+        "tokens": sum(report["tokens"] for report in reports),
+        "cached_tokens": sum(report["cached_tokens"] for report in reports),
+        # How often each kind of run budget stopped an agent, across all builds
+        "budget_trips": dict(budget_trips),
+        # Prompt and provider-cached prompt tokens per agent, from the API's usage reports
+        "prompt_cache": {name: dict(stats) for name, stats in prompt_cache_stats.items()},
+        # Hits, misses and hit rate of RESPONSE_CACHE_DIR across all builds, None if unset
+        "response_cache": response_cache_stats(),
+        "builds": reports,
+    }
+
+
+def print_summary(summary):
+    print(f"{'image':<32}{'status':>8}{'milestones':>12}{'latency (s)':>13}{'tokens':>10}{'cached':>10}")
+    for report in summary["builds"]:
+        status = "ok" if report["success"] else "failed"
+        milestones = f"{report['milestones_done']}/{report['milestones']}"
+        print(f"{report['session_id']:<32}{status:>8}{milestones:>12}{report['latency']:>13.1f}{report['tokens']:>10}{report['cached_tokens']:>10}")
+        if report["error"]:
+            print(f"    {report['error']}")
+        if report["budget_trips"]:
+            print("    stopped by budget: " + ", ".join(f"{kind} x{count}" for kind, count in report["budget_trips"].items()))
+    speedup = summary["serial_time"] / summary["wall_time"] if summary["wall_time"] else 0.0
+    print(
+        f"{summary['succeeded']}/{summary['images']} succeeded, {summary['tokens']} tokens ({summary['cached_tokens']} cached prompt tokens), wall time {summary['wall_time']:.1f}s "
+        f"(serial {summary['serial_time']:.1f}s, {speedup:.1f}x at concurrency {summary['concurrency']})"
+    )
+    if summary["prompt_cache"]:
+        print("cached prompt tokens: " + ", ".join(f"{name} {stats['cached_tokens']}/{stats['prompt_tokens']}" for name, stats in summary["prompt_cache"].items()))
+    if summary["response_cache"]:
+        cache = summary["response_cache"]
+        print(f"response cache: {cache['hits']} hits, {cache['misses']} misses ({100 * cache['hit_rate']:.0f}% hit rate)")
+    if summary["budget_trips"]:
+        print("budget trips: " + ", ".join(f"{kind} x{count}" for kind, count in summary["budget_trips"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="directory of screenshots")
+    parser.add_argument("--output", default="builds", help="each image is built into OUTPUT/<image name>")
+    parser.add_argument("--concurrency", type=int, default=4, help="builds running at once")
+    parser.add_argument("--prompt", default=DEFAULT_PROMPT, help="the user message sent with each screenshot")
+    parser.add_argument("--supervisor-mode", choices=["llm", "rules"], default="rules", help="route with the supervisor LLM or the rule-based orchestrator")
+    parser.add_argument("--report", help="also write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    images = find_images(args.input)
+    if not images:
+        parser.error(f"no images found in {args.input}")
+
+    supervisor = SupervisorAgent(
+        name="Supervisor Agent",
+        prompt=SUPERVISOR_PROMPT,
+        context_window=ContextWindow(max_tokens=16000),
+        context_builder=MilestoneContext(include_overview=False, files=("plan.md",)),
+        max_iterations=60,
+        orchestrator=Orchestrator(max_revisions=int(os.getenv("SUPERVISOR_MAX_REVISIONS", "3"))) if args.supervisor_mode == "rules" else None,
+    )
+    summary = asyncio.run(run_batch(supervisor, images, args.output, args.concurrency, args.prompt))
+    print_summary(summary)
+    if args.report:
+        with open(args.report, "w") as file:
+            json.dump(summary, file, indent=2)
+    # Non-zero so a scheduled job notices failed builds
+    sys.exit(0 if summary["succeeded"] == summary["images"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark of process startup: import time and first-request latency.
+
+Each run starts a fresh interpreter that imports a module (agents.supervisor_agent, or
+app as the Chainlit worker does), then makes the first LLM request of a build, the
+planning agent's, through the real client against a local server that streams a canned
+completion. The first request includes whatever the import deferred, such as building
+the agents and the client. No OpenAI account is needed.
+
+    python -m benchmarks.startup_benchmark --runs 5
+    python -m benchmarks.startup_benchmark --module app --json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Runs in the child interpreter. Stops with os._exit so background exporters started by
+# the imported modules can't hold up the measurement.
+CHILD = """
+import asyncio, json, os, sys, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+
+from agents.supervisor_agent import SupervisorAgent
+from agents.ui import HeadlessUI, use_ui
+
+async def first_request():
+    use_ui(HeadlessUI())
+    agent = SupervisorAgent(name="Supervisor Agent", client=None).agents.get("planning")
+    await agent.handle_tool_calls([{{"role": "user", "content": "Please build the web page in this screenshot."}}], call_tools=False)
+
+asyncio.run(first_request())
+done = time.perf_counter()
+print(json.dumps({{"import": imported - started, "first_request": done - imported, "modules": len(sys.modules)}}))
+sys.stdout.flush()
+os._exit(0)
+"""
+
+
+def _chunk(delta, finish_reason=None, usage=None):
+    choices = [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    chunk = {"id": "startup", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o-mini", "choices": choices}
+    if usage:
+        chunk["usage"] = usage
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    """
+    Answers every chat completion request with a short streamed reply.
+    """
+
+    body = (
+        _chunk({"role": "assistant", "content": "Here is the plan."})
+        + _chunk({}, finish_reason="stop")
+        + _chunk(None, usage={"prompt_tokens": 20, "completion_tokens": 5, "total_tokens": 25})
+        + "data: [DONE]\n\n"
+    ).encode()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure(module, base_url):
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "startup",
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_MAX_RETRIES": "0",
+        "CHECKPOINT_DB": "",
+        "PYTHONDONTWRITEBYTECODE": "",
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD.format(module=module)],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", help="module to import, agents.supervisor_agent and app by default")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print the raw measurements as JSON")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+    # One untimed run per module warms the bytecode and disk caches
+    reports = {}
+    for module in args.module or ["agents.supervisor_agent", "app"]:
+        measure(module, base_url)
+        reports[module] = [measure(module, base_url) for _ in range(args.runs)]
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"{'module':<26}{'import (s)':>12}{'first request (s)':>19}{'total (s)':>11}{'modules':>9}")
+    for module, runs in reports.items():
+        imports = statistics.median(run["import"] for run in runs)
+        first = statistics.median(run["first_request"] for run in runs)
+        print(f"{module:<26}{imports:>12.3f}{first:>19.3f}{imports + first:>11.3f}{runs[-1]['modules']:>9}")
+    print(f"medians of {args.runs} runs")
+
+
+if __name__ == "__main__":
+    main()
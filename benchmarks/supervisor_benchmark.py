@@ -0,0 +1,273 @@
+"""
+Offline benchmark of a full planning -> implementation -> review build.
+
+Drives SupervisorAgent.execute headlessly against MockAsyncOpenAI clients that stream a
+scripted build, and reports per-agent call counts, tokens, time to first token, stream
+time, total wall time and artifact I/O. No OpenAI account is needed.
+
+Provider prompt caching is simulated: a call counts as cached for the longest prefix it
+shares with an earlier call of the same agent, in 128 token steps from 1024 tokens up,
+which is how OpenAI caches prompts. Compare PROMPT_LAYOUT=classic and PROMPT_LAYOUT=prefix.
+
+    python -m benchmarks.supervisor_benchmark --milestones 5 --runs 3
+    python -m benchmarks.supervisor_benchmark --first-token-latency 0.3 --chunk-latency 0.002 --json
+    python -m benchmarks.supervisor_benchmark --supervisor-mode rules
+    python -m benchmarks.supervisor_benchmark --supervisor-mode rules --candidates 3
+    python -m benchmarks.supervisor_benchmark --response-cache .cache/benchmark-responses
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from agents.artifact_store import ArtifactStore
+from agents.budget import RunBudget, use_budget
+from agents.candidates import CandidateImplementer, CandidateSelector
+from agents.context_builder import MilestoneContext
+from agents.context_window import ContextWindow, count_text_tokens, count_tokens
+from agents.implementation_agent import ImplementationAgent
+from agents.mock_client import MockAsyncOpenAI
+from agents.orchestrator import Orchestrator
+from agents.response_cache import CachingClient, ResponseCache
+from agents.scheduler import scheduler
+from agents.planning_agent import PlanningAgent
+from agents.reviewer_agent import ReviewerAgent
+from agents.supervisor_agent import IMPLEMENTATION_PROMPT, PLANNING_PROMPT, REVIEW_PROMPT, SELECTION_PROMPT, SUPERVISOR_PROMPT, SupervisorAgent
+from agents.ui import HeadlessUI, use_ui
+from agents.workspace import use_workspace
+
+
+def simulated_cached_tokens(prompt, prompt_tokens, previous_prompts):
+    """
+    Estimates the prompt tokens a provider would serve from its prefix cache.
+    """
+    if prompt_tokens < 1024 or not previous_prompts:
+        return 0
+    shared = max(len(os.path.commonprefix([prompt, previous])) for previous in previous_prompts)
+    return int(prompt_tokens * shared / len(prompt)) // 128 * 128
+
+
+class MeteredClient:
+    """
+    Wraps a client and records tokens, simulated cached tokens, time to first token and
+    stream time per call.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        prompt_tokens = count_tokens(kwargs.get("messages", []))
+        # Tools come before the messages in the provider's prompt
+        prompt = json.dumps([kwargs.get("tools"), kwargs.get("messages")], default=str)
+        call = {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": simulated_cached_tokens(prompt, prompt_tokens, self.prompts),
+            "completion_tokens": 0,
+            "ttft": None,
+        }
+        self.prompts.append(prompt)
+        self.calls.append(call)
+        started = time.perf_counter()
+        stream = await self.client.chat.completions.create(**kwargs)
+        return self._meter(stream, call, started)
+
+    async def _meter(self, stream, call, started):
+        async for part in stream:
+            if not part.choices:
+                yield part
+                continue
+            if call["ttft"] is None:
+                call["ttft"] = time.perf_counter() - started
+            delta = part.choices[0].delta
+            text = (delta.content or "") + "".join(tool_call.function.arguments or "" for tool_call in delta.tool_calls or [])
+            call["completion_tokens"] += count_text_tokens(text) if text else 0
+            yield part
+        call["duration"] = time.perf_counter() - started
+
+
+def build_scripts(milestones, section_bytes):
+    """
+    Returns the scripted responses of each agent for a build with the given milestones.
+    """
+    plan = "# Plan\n\n## Overview\n\nA page with a header, content sections and a footer.\n\n## Milestones\n\n"
+    plan += "".join(f" - [ ] {i}. Build section {i}\n" for i in range(1, milestones + 1))
+    filler = ("lorem ipsum " * (section_bytes // 12 + 1))[:section_bytes]
+
+    scripts = {
+        "planning": [
+            {"content": "Here is the plan.", "tool_calls": [
+                {"name": "updateArtifact", "arguments": {"filename": "plan.md", "contents": plan}},
+            ]},
+            "The plan has been saved.",
+        ],
+        "implementation": [],
+        "reviewer": [],
+        "supervisor": [{"tool_calls": [{"name": "callAgent", "arguments": {"agent_name": "planning"}}]}],
+    }
+
+    for i in range(1, milestones + 1):
+        html = "<html><body>\n" + "".join(f"<section class='s{j}'>{filler}</section>\n" for j in range(1, i + 1)) + "</body></html>"
+        css = "".join(f".s{j} {{ padding: {j}px; }}\n" for j in range(1, i + 1))
+        scripts["implementation"].extend([
+            {"tool_calls": [
+                {"name": "updateArtifact", "arguments": {"filename": "index.html", "contents": html}},
+                {"name": "updateArtifact", "arguments": {"filename": "styles.css", "contents": css}},
+                {"name": "patchArtifact", "arguments": {"filename": "plan.md", "edits": [
+                    {"search": f" - [ ] {i}.", "replace": f" - [x] {i}."},
+                ]}},
+            ]},
+            f"Milestone {i} is implemented.",
+        ])
+        scripts["reviewer"].append({"tool_calls": [
+            {"name": "submitReview", "arguments": {"verdict": "approved", "summary": f"Milestone {i} looks good and is marked off in the plan.", "issues": []}},
+        ]})
+        scripts["supervisor"].extend([
+            {"tool_calls": [{"name": "callAgent", "arguments": {"agent_name": "implementation"}}]},
+            {"tool_calls": [{"name": "callAgent", "arguments": {"agent_name": "reviewer"}}]},
+        ])
+
+    scripts["supervisor"].append("All milestones have been implemented and reviewed.")
+    return scripts
+
+
+def implementation_responder(script):
+    """
+    Answers implementation calls from the request rather than in script order, since
+    concurrent candidates interleave their calls: after an artifact update the turn ends,
+    otherwise the next unchecked milestone of the plan is implemented.
+    """
+    tool_calls = script[0::2]
+    replies = script[1::2]
+
+    def responder(request):
+        messages = [message for message in request["messages"] if "<ARTIFACTS>" not in str(message.get("content"))]
+        pending = re.findall(r"- \[ \] (\d+)\.", "\n".join(str(message.get("content")) for message in request["messages"]))
+        if "was updated" in str(messages[-1].get("content")):
+            # The milestone just marked off is the one before the first unchecked one
+            return replies[int(pending[0]) - 2 if pending else -1]
+        return tool_calls[int(pending[0]) - 1]
+
+    return responder
+
+
+async def run_build(milestones, section_bytes, first_token_latency, chunk_latency, chunk_size, supervisor_mode="llm", candidates=1, response_cache=None):
+    scripts = build_scripts(milestones, section_bytes)
+    if candidates > 1:
+        scripts["selector"] = [
+            {"tool_calls": [{"name": "pickCandidate", "arguments": {"candidate": 1, "reason": "It implements the milestone completely."}}]}
+        ] * milestones
+    responders = {"implementation": implementation_responder(scripts["implementation"])} if candidates > 1 else {}
+    clients = {
+        name: MockAsyncOpenAI(
+            None if name in responders else script,
+            responder=responders.get(name),
+            first_token_latency=first_token_latency,
+            chunk_latency=chunk_latency,
+            chunk_size=chunk_size,
+        )
+        for name, script in scripts.items()
+    }
+    # Later runs replay the builds recorded by earlier ones
+    cache = ResponseCache(response_cache) if response_cache else None
+    clients = {name: MeteredClient(CachingClient(client, cache) if cache else client) for name, client in clients.items()}
+
+    agents = {
+        "planning": PlanningAgent(name="Planning Agent", client=clients["planning"], prompt=PLANNING_PROMPT, context_window=ContextWindow(max_tokens=24000)),
+        "implementation": ImplementationAgent(name="Implementation Agent", client=clients["implementation"], prompt=IMPLEMENTATION_PROMPT, context_window=ContextWindow(max_tokens=32000), context_builder=MilestoneContext(focus="next")),
+        "reviewer": ReviewerAgent(name="Reviewer Agent", client=clients["reviewer"], prompt=REVIEW_PROMPT, context_window=ContextWindow(max_tokens=24000), context_builder=MilestoneContext(focus="latest", include_overview=False)),
+    }
+    if candidates > 1:
+        selector = CandidateSelector(name="Candidate Selector", client=clients["selector"], prompt=SELECTION_PROMPT, context_window=ContextWindow(max_tokens=32000), context_builder=MilestoneContext(focus="next", include_overview=False))
+        agents["implementation"] = CandidateImplementer(agents["implementation"], selector=selector, candidates=candidates)
+    supervisor = SupervisorAgent(name="Supervisor Agent", client=clients["supervisor"], prompt=SUPERVISOR_PROMPT, context_window=ContextWindow(max_tokens=16000), context_builder=MilestoneContext(include_overview=False, files=("plan.md",)), max_iterations=max(60, 2 * milestones + 2), agents=agents, orchestrator=Orchestrator() if supervisor_mode == "rules" else None)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ArtifactStore(directory)
+        use_workspace(store)
+        use_ui(HeadlessUI())
+
+        # Every agent puts its own system prompt first
+        message_history = [
+            {"role": "user", "content": "Please build the web page in this screenshot."},
+        ]
+        budget = RunBudget.from_env()
+        use_budget(budget)
+        started = time.perf_counter()
+        await supervisor.execute(message_history)
+        wall_time = time.perf_counter() - started
+
+    report = {"wall_time": wall_time, "artifacts": store.stats(), "budget_trips": dict(budget.trips), "agents": {}}
+    if cache:
+        report["response_cache"] = {"hits": budget.response_cache_hits, "misses": budget.response_cache_misses}
+    if scheduler.enabled:
+        report["scheduler"] = {key: value for key, value in scheduler.stats().items() if key != "by_priority"}
+    for name, client in clients.items():
+        calls = client.calls
+        report["agents"][name] = {
+            "calls": len(calls),
+            "prompt_tokens": sum(call["prompt_tokens"] for call in calls),
+            "cached_tokens": sum(call["cached_tokens"] for call in calls),
+            "completion_tokens": sum(call["completion_tokens"] for call in calls),
+            "mean_ttft": statistics.mean(call["ttft"] for call in calls if call["ttft"] is not None) if calls else 0.0,
+            "stream_time": sum(call.get("duration", 0.0) for call in calls),
+        }
+    return report
+
+
+def print_report(reports):
+    wall_times = [report["wall_time"] for report in reports]
+    last = reports[-1]
+    print(f"runs: {len(reports)}  wall time: mean {statistics.mean(wall_times):.3f}s  min {min(wall_times):.3f}s  max {max(wall_times):.3f}s")
+    print(f"{'agent':<16}{'calls':>7}{'prompt tok':>12}{'cached tok':>12}{'compl tok':>11}{'ttft (s)':>10}{'stream (s)':>12}")
+    for name, stats in last["agents"].items():
+        print(f"{name:<16}{stats['calls']:>7}{stats['prompt_tokens']:>12}{stats['cached_tokens']:>12}{stats['completion_tokens']:>11}{stats['mean_ttft']:>10.3f}{stats['stream_time']:>12.3f}")
+    print("artifacts:", ", ".join(f"{key}={value}" for key, value in last["artifacts"].items()))
+    trips = Counter()
+    for report in reports:
+        trips.update(report["budget_trips"])
+    print("budget trips:", ", ".join(f"{kind}={count}" for kind, count in trips.items()) or "none")
+    if "response_cache" in last:
+        per_run = ", ".join(f"{report['response_cache']['hits']}/{report['response_cache']['hits'] + report['response_cache']['misses']}" for report in reports)
+        hits = sum(report["response_cache"]["hits"] for report in reports)
+        total = hits + sum(report["response_cache"]["misses"] for report in reports)
+        print(f"response cache: {per_run} calls answered per run, hit rate {hits / total if total else 0.0:.3f}")
+    if "scheduler" in last:
+        print("scheduler:", ", ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}" for key, value in last["scheduler"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--milestones", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--section-bytes", type=int, default=2000, help="size of each generated HTML section")
+    parser.add_argument("--first-token-latency", type=float, default=0.0)
+    parser.add_argument("--chunk-latency", type=float, default=0.0)
+    parser.add_argument("--chunk-size", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--supervisor-mode", choices=["llm", "rules"], default="llm", help="route with the supervisor LLM or the rule-based orchestrator")
+    parser.add_argument("--candidates", type=int, default=1, help="implement each milestone this many times in parallel and keep the best")
+    parser.add_argument("--response-cache", metavar="DIR", help="serve repeated requests from a ResponseCache in DIR, so later runs replay earlier ones")
+    parser.add_argument("--json", action="store_true", help="print the raw reports as JSON")
+    args = parser.parse_args()
+
+    reports = [
+        asyncio.run(run_build(args.milestones, args.section_bytes, args.first_token_latency, args.chunk_latency, args.chunk_size, args.supervisor_mode, args.candidates, args.response_cache))
+        for _ in range(args.runs)
+    ]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print_report(reports)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import pytest
+
+from agents.artifact_store import InMemoryArtifactStore
+from agents.base_agent import Agent
+from agents.stream_relay import ToolCallProgress
+from agents.ui import HeadlessUI
+
+
+def apply(store, name, arguments):
+    agent = Agent("Test Agent", artifact_store=store)
+    return asyncio.run(agent._apply_artifact_tool({"name": name, "arguments": arguments}))
+
+
+@pytest.mark.parametrize("arguments", [
+    '{"filename": "index.html", "contents": "<p>hi</p>", "x',
+    '{"filename": "index.html", "contents": "<p>hi</p>",',
+    '{"filename": "index.html", "contents": "<p>hi</p>"',
+])
+def test_cut_off_update_with_complete_contents_is_saved(arguments):
+    store = InMemoryArtifactStore()
+    note = apply(store, "updateArtifact", arguments)
+    assert store.read("index.html") == "<p>hi</p>"
+    assert "cut off after its contents arrived" in note
+
+
+def test_cut_off_update_with_partial_contents_is_not_saved():
+    store = InMemoryArtifactStore(files={"index.html": "<p>old</p>"})
+    note = apply(store, "updateArtifact", '{"filename": "index.html", "contents": "<p>ne')
+    assert store.read("index.html") == "<p>old</p>"
+    assert "kept as a draft" in note
+
+
+def test_cut_off_patch_applies_complete_edits():
+    store = InMemoryArtifactStore(files={"styles.css": "a { color: red; }\nb { color: blue; }\n"})
+    text = json.dumps({"filename": "styles.css", "edits": [{"search": "red", "replace": "green"}, {"search": "blue", "replace": "black"}]})
+    note = apply(store, "patchArtifact", text[:text.rindex('"black"')])
+    assert store.read("styles.css") == "a { color: green; }\nb { color: blue; }\n"
+    assert "first 1 complete edits" in note
+
+
+def stream_call(store, arguments, size=8):
+    progress = ToolCallProgress(HeadlessUI(), ["updateArtifact"], store=store, draft_interval=0.0)
+    fragments = []
+
+    async def run():
+        for i in range(0, len(arguments), size):
+            fragments.append(arguments[i:i + size])
+            await progress.update(0, ["updateArtifact"], fragments)
+        await progress.close()
+
+    asyncio.run(run())
+
+
+def test_draft_is_kept_exactly_when_the_contents_are_not_saved():
+    for arguments in ['{"filename": "index.html", "contents": "<p>hello</p>"', '{"filename": "index.html", "contents": "<p>hel']:
+        store = InMemoryArtifactStore()
+        stream_call(store, arguments)
+        apply(store, "updateArtifact", arguments)
+        saved = store.read("index.html") is not None
+        assert saved != (store.read_draft("index.html") is not None)
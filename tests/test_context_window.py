@@ -0,0 +1,36 @@
+from agents.context_window import ContextWindow, count_tokens
+
+MESSAGES = [
+    {"role": "system", "content": "You build web pages."},
+    {"role": "user", "content": "Please build this page."},
+] + [
+    {"role": "assistant" if i % 2 else "user", "content": "word " * 200 + str(i)}
+    for i in range(10)
+]
+
+
+def test_recent_messages_are_kept_when_they_fit_on_their_own():
+    # Just enough room for the recent messages, so the summary has to shrink instead
+    budget = count_tokens(MESSAGES[:2] + MESSAGES[-4:]) + 30
+    fitted = ContextWindow(max_tokens=budget, keep_recent=4).fit(MESSAGES)
+
+    assert fitted[:2] == MESSAGES[:2]
+    assert fitted[2]["content"].startswith("Summary of 6 earlier messages")
+    assert fitted[3:] == MESSAGES[-4:]
+    assert count_tokens(fitted) <= budget
+
+
+def test_recent_messages_go_when_they_alone_are_over_budget():
+    budget = count_tokens(MESSAGES[:2] + MESSAGES[-3:])
+    fitted = ContextWindow(max_tokens=budget, keep_recent=4).fit(MESSAGES)
+
+    assert fitted[2]["content"].startswith("Summary of")
+    assert 1 <= len(fitted[3:]) < 4
+    assert fitted[3:] == MESSAGES[len(MESSAGES) - len(fitted[3:]):]
+    assert count_tokens(fitted) <= budget
+
+
+def test_last_message_is_never_dropped():
+    fitted = ContextWindow(max_tokens=100, keep_recent=4).fit(MESSAGES)
+
+    assert fitted[-1] == MESSAGES[-1]
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from agents.json_stream import ArgumentStream, parse_arguments
+
+ARGUMENTS = json.dumps({
+    "filename": "index.html",
+    "contents": "<p class=\"a\">café \U0001F600\n\t\\</p>",
+    "edits": [{"search": "a}", "replace": "[b]"}],
+    "count": 3,
+})
+
+
+def feed(text, size):
+    stream = ArgumentStream()
+    for i in range(0, len(text), size):
+        stream.feed(text[i:i + size])
+    return stream
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, len(ARGUMENTS)])
+def test_stream_decodes_values_in_any_fragment_size(size):
+    stream = feed(ARGUMENTS, size)
+    expected = json.loads(ARGUMENTS)
+    assert stream.closed and stream.error is None
+    assert stream.value("filename") == expected["filename"]
+    assert stream.value("contents") == expected["contents"]
+    assert stream.complete == {"filename", "contents"}
+    assert stream.length == len(ARGUMENTS)
+
+
+def test_stream_exposes_partial_values():
+    text = json.dumps({"filename": "styles.css", "contents": "body { margin: 0; }"})
+    stream = feed(text[:text.index("margin")], 4)
+    assert stream.value("filename") == "styles.css"
+    assert stream.value("contents") == "body { "
+    assert "contents" not in stream.complete
+    assert not stream.closed
+    assert stream.value("missing") is None
+
+
+def test_stream_escape_split_across_fragments():
+    stream = ArgumentStream()
+    for fragment in ['{"contents": "a\\', "u00", 'e9\\', 'nb"}']:
+        stream.feed(fragment)
+    assert stream.value("contents") == "aé\nb"
+    assert stream.closed
+
+
+def test_stream_stops_at_syntax_error():
+    stream = ArgumentStream()
+    stream.feed('{"filename": "a" x}')
+    assert stream.error == 17
+    assert stream.value("filename") == "a"
+    assert not stream.closed
+
+
+def test_parse_arguments_complete():
+    assert parse_arguments(ARGUMENTS) == (json.loads(ARGUMENTS), False)
+    assert parse_arguments("") == ({}, False)
+
+
+def test_parse_arguments_salvages_complete_values():
+    text = json.dumps({"filename": "index.html", "edits": [{"search": "a", "replace": "b"}, {"search": "c", "replace": "d"}]})
+    arguments, truncated = parse_arguments(text[:text.rindex('"d"')])
+    assert truncated
+    # The last edit keeps its complete search text; callers drop edits without a replacement
+    assert arguments == {"filename": "index.html", "edits": [{"search": "a", "replace": "b"}, {"search": "c"}]}
+
+
+def test_parse_arguments_drops_cut_off_string():
+    text = json.dumps({"filename": "index.html", "contents": "<p>cut off"})
+    arguments, truncated = parse_arguments(text[:-10])
+    assert truncated
+    assert arguments == {"filename": "index.html"}
+
+
+@pytest.mark.parametrize("text", ["not json", "[1, 2]", '{"a'])
+def test_parse_arguments_nothing_to_salvage(text):
+    assert parse_arguments(text) == ({}, True)
+
+
+def test_parse_arguments_keeps_contents_missing_only_the_closing_brace():
+    text = '{"filename":"index.html","contents":"<p>hello</p>"'
+    stream = ArgumentStream()
+    stream.feed(text)
+    assert "contents" in stream.complete
+    assert parse_arguments(text) == ({"filename": "index.html", "contents": "<p>hello</p>"}, True)
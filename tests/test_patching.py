@@ -0,0 +1,78 @@
+import difflib
+import random
+
+import pytest
+
+from agents.patching import PatchConflict, apply_patch, apply_search_replace, apply_unified_diff
+
+
+def unified_diff(before, after, context=3):
+    lines = difflib.unified_diff(before.splitlines(keepends=True), after.splitlines(keepends=True), "a/file", "b/file", n=context)
+    return "".join(line if line.endswith("\n") else line + "\n" for line in lines)
+
+
+def test_search_replace_applies_edits_in_order():
+    text = "<h1>Title</h1>\n<p>Body</p>\n"
+    edits = [{"search": "Title", "replace": "Heading"}, {"search": "Heading</h1>", "replace": "Heading!</h1>"}]
+    assert apply_search_replace(text, edits) == "<h1>Heading!</h1>\n<p>Body</p>\n"
+
+
+@pytest.mark.parametrize("search, message", [("", "empty search"), ("missing", "not found"), ("p", "matches 2 places")])
+def test_search_replace_conflicts(search, message):
+    with pytest.raises(PatchConflict, match=message):
+        apply_search_replace("<p>a</p>", [{"search": search, "replace": "x"}])
+
+
+def test_unified_diff_with_context():
+    before = "a\nb\nc\nd\ne\n"
+    after = "a\nb\nC\nd\ne\nf\n"
+    assert apply_unified_diff(before, unified_diff(before, after)) == after
+
+
+def test_unified_diff_tolerates_drifted_line_numbers():
+    before = "one\ntwo\nthree\nfour\n"
+    diff = "@@ -1,2 +1,2 @@\n three\n-four\n+FOUR\n"
+    assert apply_unified_diff(before, diff) == "one\ntwo\nthree\nFOUR\n"
+
+
+@pytest.mark.parametrize("diff, expected", [
+    # "-N,0" inserts after line N
+    ("@@ -2,0 +3 @@\n+new\n", "a\nb\nnew\nc\n"),
+    ("@@ -0,0 +1 @@\n+new\n", "new\na\nb\nc\n"),
+    ("@@ -3,0 +4 @@\n+new\n", "a\nb\nc\nnew\n"),
+])
+def test_unified_diff_pure_insertion(diff, expected):
+    assert apply_unified_diff("a\nb\nc\n", diff) == expected
+
+
+def test_unified_diff_conflict():
+    with pytest.raises(PatchConflict, match="hunk 1"):
+        apply_unified_diff("a\nb\n", "@@ -1 +1 @@\n-x\n+y\n")
+
+
+def test_unified_diff_without_hunks():
+    with pytest.raises(PatchConflict, match="no hunks"):
+        apply_unified_diff("a\n", "--- a/file\n+++ b/file\n")
+
+
+@pytest.mark.parametrize("context", [0, 1, 3])
+def test_unified_diff_round_trips_random_edits(context):
+    rng = random.Random(context)
+    for _ in range(300):
+        before = [rng.choice("abcde") for _ in range(rng.randint(0, 12))]
+        after = list(before)
+        for _ in range(rng.randint(1, 4)):
+            position = rng.randint(0, len(after))
+            if rng.random() < 0.5 or not after:
+                after.insert(position, rng.choice("vwxyz"))
+            else:
+                del after[min(position, len(after) - 1)]
+        before_text = "".join(line + "\n" for line in before)
+        after_text = "".join(line + "\n" for line in after)
+        if before_text != after_text:
+            assert apply_unified_diff(before_text, unified_diff(before_text, after_text, context)) == after_text
+
+
+def test_apply_patch_needs_edits_or_diff():
+    with pytest.raises(PatchConflict):
+        apply_patch("a")